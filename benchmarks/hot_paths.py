@@ -0,0 +1,161 @@
+"""Time the prediction and optimisation hot paths on fixed, seeded inputs from the Reis & Salis dataset.
+
+Every case is run --repeat times after a warm-up call, and its median time per operation (one call, 1k sequences
+or one optimisation run) is appended with the commit and library versions to a JSON history file. --compare
+checks the new run against the last run in the history over the same inputs and exits with status 1 if any case
+got slower by more than --threshold.
+
+    python benchmarks/hot_paths.py --compare --threshold 0.1
+    python benchmarks/hot_paths.py --only find_tir feature --repeat 3 --no-save
+"""
+import argparse
+import datetime
+import json
+import os
+import platform
+import random
+import statistics
+import subprocess
+import sys
+import time
+import warnings
+
+root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, root)
+
+import RNA
+import numpy as np
+import pandas as pd
+
+from optimise import optimize_rbs
+from predict import (find_accessibility_score, find_au_score, find_codon_score, find_features, find_spacing, find_standby_score,
+                     find_tir, find_tir_batch, predict_features)
+
+warnings.filterwarnings("ignore", category=UserWarning)
+
+default_history = os.path.join(root, "benchmarks", "hot_paths_history.json")
+
+
+def load_rows(count, seed):
+    df = pd.read_csv(os.path.join(root, "model_files", "Dataset - Reis and Salis - 1014.csv")).sample(count, random_state=seed)
+    return [{"gram": row["Gram stain"], "temp": float(row["Temperature"]), "rRNA": row["rRNA"].upper().replace("T","U")[-8:],
+             "RBS": row["RBS"].upper().replace("T","U"), "CDS": row["CDS"].upper().replace("T","U")} for _, row in df.iterrows()]
+
+
+def mutate(rbs, rng, changes=3):
+    rbs = list(rbs)
+    for position in rng.sample(range(len(rbs)), min(changes, len(rbs))):
+        rbs[position] = rng.choice("ACGU")
+    return "".join(rbs)
+
+
+def find_cases(rows, seed, generations):
+    # name -> (unit, operations per call of run, run)
+    rng = random.Random(seed)
+    for row in rows:
+        row["SD"] = find_spacing(row["rRNA"], row["RBS"], row["temp"], row["gram"])[1]
+        row["structure"] = find_accessibility_score(row["RBS"], row["CDS"], row["SD"], row["temp"])[0]
+    design = rows[0]
+    mutants = [mutate(design["RBS"], rng) for _ in range(1000)]
+    features = np.array([find_features(row["gram"], row["temp"], row["rRNA"], row["RBS"], row["CDS"]) for row in rows] * (1000 // len(rows) + 1))[:1000]
+    target = round(rng.uniform(1.5, 4.0), 2)
+
+    return {
+        "find_tir": ("call", len(rows), lambda: [find_tir(row["gram"], row["temp"], row["rRNA"], row["RBS"], row["CDS"]) for row in rows]),
+        "find_tir_batch": ("1k sequences", 1, lambda: find_tir_batch(design["gram"], design["temp"], design["rRNA"], mutants, design["CDS"])),
+        "predict_features": ("1k sequences", 1, lambda: predict_features(features)),
+        "feature/find_spacing": ("call", len(rows), lambda: [find_spacing(row["rRNA"], row["RBS"], row["temp"], row["gram"]) for row in rows]),
+        "feature/find_au_score": ("call", len(rows), lambda: [find_au_score(row["RBS"], row["SD"]) for row in rows]),
+        "feature/find_accessibility_score": ("call", len(rows), lambda: [find_accessibility_score(row["RBS"], row["CDS"], row["SD"], row["temp"]) for row in rows]),
+        "feature/find_standby_score": ("call", len(rows), lambda: [find_standby_score(row["RBS"], row["SD"], row["structure"]) for row in rows]),
+        "feature/find_codon_score": ("call", len(rows), lambda: [find_codon_score(row["CDS"]) for row in rows]),
+        "optimize_rbs/ga": ("run", 1, lambda: optimize_rbs(target, design["gram"], design["temp"], design["rRNA"], design["RBS"], design["CDS"], generations=generations, strategy="ga", rng=random.Random(seed))),
+        "optimize_rbs/hill_climb": ("run", 1, lambda: optimize_rbs(target, design["gram"], design["temp"], design["rRNA"], design["RBS"], design["CDS"], generations=generations, strategy="hill_climb", rng=random.Random(seed))),
+    }
+
+
+def time_case(operations, run, repeat):
+    run() # Loads the model and energy tables outside the timing
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        run()
+        timings.append((time.perf_counter() - start) / operations)
+    return {"median": statistics.median(timings), "min": min(timings)}
+
+
+def find_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=root, capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(results, baseline, threshold):
+    # Cases whose median time grew by more than threshold (a fraction) over the baseline run
+    regressions = []
+    for name, result in results.items():
+        before = baseline["results"].get(name)
+        if before is None:
+            continue
+        change = result["median"] / before["median"] - 1
+        print(f"{name:<36}{before['median'] * 1e6:>14.1f}{result['median'] * 1e6:>14.1f}{change:>+10.1%}{'  REGRESSION' if change > threshold else ''}")
+        if change > threshold:
+            regressions.append(name)
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, default=100, help="Dataset rows timed by the per-call cases")
+    parser.add_argument("--seed", type=int, default=2023)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--generations", type=int, default=10, help="Generations of each optimize_rbs run")
+    parser.add_argument("--only", nargs="+", help="Run only the cases whose names contain one of these")
+    parser.add_argument("--history", default=default_history)
+    parser.add_argument("--no-save", action="store_true", help="Do not append this run to the history")
+    parser.add_argument("--compare", action="store_true", help="Compare with the last run in the history")
+    parser.add_argument("--threshold", type=float, default=0.1, help="Slowdown flagged as a regression, as a fraction")
+    args = parser.parse_args()
+
+    cases = find_cases(load_rows(args.rows, args.seed), args.seed, args.generations)
+    if args.only:
+        cases = {name: case for name, case in cases.items() if any(part in name for part in args.only)}
+
+    results = {}
+    print(f"{'case':<36}{'unit':>14}{'median µs':>14}{'min µs':>14}")
+    for name, (unit, operations, run) in cases.items():
+        results[name] = dict(time_case(operations, run, args.repeat), unit=unit)
+        print(f"{name:<36}{unit:>14}{results[name]['median'] * 1e6:>14.1f}{results[name]['min'] * 1e6:>14.1f}")
+
+    history = []
+    if os.path.exists(args.history):
+        with open(args.history) as f:
+            history = json.load(f)
+
+    # Only runs over the same inputs are comparable
+    settings = {"rows": args.rows, "seed": args.seed, "generations": args.generations}
+    earlier = [entry for entry in history if all(entry.get(key) == value for key, value in settings.items())]
+
+    regressions = []
+    if args.compare:
+        if earlier:
+            print(f"\nCompared with {earlier[-1]['commit']} at {earlier[-1]['timestamp']}")
+            print(f"{'case':<36}{'before µs':>14}{'now µs':>14}{'change':>10}")
+            regressions = compare(results, earlier[-1], args.threshold)
+        else:
+            print(f"\nNo earlier run with these settings in {args.history} to compare with")
+
+    if not args.no_save:
+        history.append({"timestamp": datetime.datetime.now().isoformat(timespec="seconds"), "commit": find_commit(), "python": platform.python_version(),
+                        "vienna": RNA.__version__, **settings, "results": results})
+        with open(args.history, "w") as f:
+            json.dump(history, f, indent=2)
+
+    if regressions:
+        print(f"\n{len(regressions)} case(s) slower than {args.threshold:.0%}: {', '.join(regressions)}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
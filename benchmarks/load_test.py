@@ -0,0 +1,143 @@
+"""Load the web tier with predictions and optimisations while timing a light page.
+
+--concurrency clients post /api/predict requests with random RBSs (so the result cache cannot answer them), and
+--optimisers clients keep submitting /api/optimise jobs. Meanwhile the home page is fetched every --probe-interval
+seconds. The report gives home page latency with no load and under load, prediction throughput, and how many
+requests were refused with a 429. Run it against a server started with `uvicorn demo.asgi:application` (or any
+ASGI or WSGI server), or with --in-process to drive the ASGI application directly without one.
+
+    python benchmarks/load_test.py --url http://127.0.0.1:8000 --concurrency 16 --optimisers 4 --duration 30
+    python benchmarks/load_test.py --in-process --concurrency 8 --duration 10
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import statistics
+import sys
+import time
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, root)
+
+cds = "ATGGCTAGCAAAGGAGAAGAACTTTTCACTGGAGTTGTCCCAATTCTTGTTGAATTAGATGGTGATG"
+
+
+def random_rbs(rng, length=30):
+    return "".join(rng.choice("ACGU") for _ in range(length))
+
+
+class ServerClient:
+    # Blocking HTTP requests to a running server, made on threads
+
+    def __init__(self, url):
+        self.url = url.rstrip("/")
+
+    def fetch(self, path, body=None):
+        request = urllib.request.Request(self.url + path, data=json.dumps(body).encode() if body is not None else None, headers={"Content-Type": "application/json"})
+        try:
+            with urllib.request.urlopen(request, timeout=300) as response:
+                response.read()
+                return response.status
+        except urllib.error.HTTPError as e:
+            return e.code
+
+    async def get(self, path):
+        return await asyncio.get_running_loop().run_in_executor(None, self.fetch, path)
+
+    async def post(self, path, body):
+        return await asyncio.get_running_loop().run_in_executor(None, self.fetch, path, body)
+
+
+class InProcessClient:
+    # The project's ASGI application, driven through Django's AsyncClient
+
+    def __init__(self):
+        os.environ.setdefault("DJANGO_SETTINGS_MODULE", "demo.settings")
+        import django
+        django.setup()
+        from django.conf import settings
+        from django.test import AsyncClient
+        settings.ALLOWED_HOSTS = ["*"]
+        self.client = AsyncClient()
+
+    async def get(self, path):
+        return (await self.client.get(path)).status_code
+
+    async def post(self, path, body):
+        return (await self.client.post(path, json.dumps(body), content_type="application/json")).status_code
+
+
+async def probe(client, interval, until):
+    latencies = []
+    while time.perf_counter() < until:
+        start = time.perf_counter()
+        await client.get("/myapp/")
+        latencies.append(time.perf_counter() - start)
+        await asyncio.sleep(max(0, interval - (time.perf_counter() - start)))
+    return latencies
+
+
+async def predict_load(client, rng, batch, until, statuses):
+    while time.perf_counter() < until:
+        status = await client.post("/api/predict", {"gram": "Negative", "temp": 37, "rrna": "ACCTCCTTA", "cds_seq": cds, "rbs_seq": [random_rbs(rng) for _ in range(batch)]})
+        statuses.append(status)
+        if status == 429:
+            await asyncio.sleep(0.1)
+
+
+async def optimise_load(client, rng, until, statuses):
+    while time.perf_counter() < until:
+        status = await client.post("/api/optimise", {"gram": "Negative", "temp": 37, "rrna": "ACCTCCTTA", "cds_seq": cds, "rbs_seq": random_rbs(rng), "target": round(rng.uniform(1.5, 4.0), 2), "max_evaluations": 2000})
+        statuses.append(status)
+        await asyncio.sleep(0.5)
+
+
+def summarise(latencies):
+    latencies = sorted(latencies)
+    return f"p50 {statistics.median(latencies) * 1000:7.1f} ms   p95 {latencies[int(0.95 * (len(latencies) - 1))] * 1000:7.1f} ms   max {latencies[-1] * 1000:7.1f} ms   ({len(latencies)} requests)"
+
+
+async def main(args):
+    loop = asyncio.get_running_loop()
+    loop.set_default_executor(ThreadPoolExecutor(max_workers=args.concurrency + args.optimisers + 4))
+    client = InProcessClient() if args.in_process else ServerClient(args.url)
+    rng = random.Random(args.seed)
+
+    # Warms up the model and the workers before anything is timed
+    await client.post("/api/predict", {"gram": "Negative", "temp": 37, "rrna": "ACCTCCTTA", "cds_seq": cds, "rbs_seq": [random_rbs(rng) for _ in range(args.batch)]})
+    idle = await probe(client, args.probe_interval, time.perf_counter() + min(args.duration, 5))
+
+    predict_statuses, optimise_statuses = [], []
+    start = time.perf_counter()
+    until = start + args.duration
+    loaded, *_ = await asyncio.gather(probe(client, args.probe_interval, until),
+                                      *[predict_load(client, random.Random(rng.random()), args.batch, until, predict_statuses) for _ in range(args.concurrency)],
+                                      *[optimise_load(client, random.Random(rng.random()), until, optimise_statuses) for _ in range(args.optimisers)])
+    elapsed = time.perf_counter() - start
+
+    print(f"home page, idle     {summarise(idle)}")
+    print(f"home page, loaded   {summarise(loaded)}")
+    scored = predict_statuses.count(200) * args.batch
+    print(f"predictions         {scored} sequences in {elapsed:.1f} s ({scored / elapsed:.1f}/s), {predict_statuses.count(429)} of {len(predict_statuses)} requests refused with 429")
+    print(f"optimisations       {len(optimise_statuses) - optimise_statuses.count(429)} accepted, {optimise_statuses.count(429)} refused with 429")
+    others = sorted({status for status in predict_statuses + optimise_statuses if status not in (200, 202, 429)})
+    if others:
+        print(f"other statuses      {others}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--url", default="http://127.0.0.1:8000")
+    parser.add_argument("--in-process", action="store_true", help="Drive demo.asgi's application directly instead of a server")
+    parser.add_argument("--concurrency", type=int, default=8, help="Clients posting predictions")
+    parser.add_argument("--optimisers", type=int, default=2, help="Clients submitting optimisations")
+    parser.add_argument("--batch", type=int, default=20, help="RBSs per prediction request")
+    parser.add_argument("--duration", type=float, default=20, help="Seconds of load")
+    parser.add_argument("--probe-interval", type=float, default=0.2, help="Seconds between home page requests")
+    parser.add_argument("--seed", type=int, default=2023)
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,57 @@
+"""Compare optimize_rbs strategies on the same evaluation budget.
+
+For a fixed, seeded sample of Reis & Salis RBS-CDS pairs and target rates, every strategy is run from the
+same starting RBS with the same seeds. The table reports the final deviation from the target and how many
+model evaluations each run needed before its best design came within --target-deviation of the target.
+
+    python benchmarks/optimisation_strategies.py --designs 6 --seeds 3 --generations 30
+"""
+import argparse
+import os
+import random
+import statistics
+import sys
+import time
+import warnings
+
+root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, root)
+
+import pandas as pd
+
+from optimise import optimize_rbs
+
+warnings.filterwarnings("ignore", category=UserWarning)
+
+
+def run(strategy, design, seed, generations, target_deviation):
+    progress = []
+    start = time.perf_counter()
+    rbs, rate, stop_reason = optimize_rbs(design["target"], design["Gram stain"], design["Temperature"], design["rRNA"], design["RBS"], design["CDS"], generations=generations, strategy=strategy, rng=random.Random(seed), callback=progress.append)
+    reached = [event["evaluations"] for event in progress if abs(event["best_rate"] - design["target"]) < target_deviation]
+    return {"deviation": abs(rate - design["target"]), "evaluations": progress[-1]["evaluations"], "evaluations_to_target": reached[0] if reached else None, "seconds": time.perf_counter() - start}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--designs", type=int, default=6, help="RBS-CDS pairs sampled from the dataset")
+    parser.add_argument("--seeds", type=int, default=3, help="Seeded runs per design and strategy")
+    parser.add_argument("--generations", type=int, default=30)
+    parser.add_argument("--target-deviation", type=float, default=0.001, help="Deviation counted as reaching the target")
+    parser.add_argument("--strategies", nargs="+", default=["hill_climb", "ga"])
+    args = parser.parse_args()
+
+    rng = random.Random(2023)
+    df = pd.read_csv(os.path.join(root, "model_files", "Dataset - Reis and Salis - 1014.csv"))
+    designs = [dict(row, target=round(rng.uniform(1.5, 4.0), 2)) for _, row in df.sample(args.designs, random_state=2023).iterrows()]
+
+    print(f"{'strategy':<12}{'mean deviation':>16}{'reached':>10}{'median evals to target':>24}{'mean evals':>12}{'mean s':>8}")
+    for strategy in args.strategies:
+        results = [run(strategy, design, seed, args.generations, args.target_deviation) for design in designs for seed in range(args.seeds)]
+        reached = [result["evaluations_to_target"] for result in results if result["evaluations_to_target"] is not None]
+        print(f"{strategy:<12}{statistics.mean(r['deviation'] for r in results):>16.5f}{f'{len(reached)}/{len(results)}':>10}"
+              f"{(statistics.median(reached) if reached else float('nan')):>24.0f}{statistics.mean(r['evaluations'] for r in results):>12.0f}{statistics.mean(r['seconds'] for r in results):>8.1f}")
+
+
+if __name__ == "__main__":
+    main()
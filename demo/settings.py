@@ -122,3 +122,83 @@ STATIC_URL = 'static/'
 # https://docs.djangoproject.com/en/4.1/ref/settings/#default-auto-field
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
+
+
+# Synthopedia
+
+# Trained model file, loaded once per process on first use
+SYNTHOPEDIA_MODEL_PATH = BASE_DIR / "iGEM IITM 2023 - Final Model.joblib"
+
+# joblib mmap_mode for the model's arrays (e.g. "r"), or None to load them into memory
+SYNTHOPEDIA_MODEL_MMAP_MODE = None
+
+# "flat" predicts with the flattened forest from flat_forest.py, "sklearn" with RandomForestRegressor.predict
+SYNTHOPEDIA_PREDICTION_BACKEND = "flat"
+
+# Forest exported by `python flat_forest.py`, loaded (memory-mapped with the mmap mode above) instead of
+# flattening the joblib model at start-up. None flattens the joblib model.
+SYNTHOPEDIA_FLAT_FOREST_PATH = None
+
+# Load the model when Django starts instead of on the first prediction
+SYNTHOPEDIA_PRELOAD_MODEL = False
+
+# Record per-stage timings of predictions and optimisations, served in the Prometheus text format at /metrics/
+SYNTHOPEDIA_METRICS = True
+
+# rRNA tails (last 8 nt) and temperatures whose SD energy tables are built on first use. Other chassis from
+# requests fold each window instead; run manage.py build_energy_tables to add a table for one ahead of time.
+SYNTHOPEDIA_ENERGY_TABLE_LAZY_BUILD = [(rRNA, temp) for rRNA in ("CCUCCUUA", "CCUCCUUU") for temp in (30, 37)]
+
+# Number of worker processes used to score each optimisation generation (None scores in the request's own process,
+# except for several starts, which get one worker per start up to the number of CPUs)
+OPTIMISE_WORKERS = None
+
+# Independently seeded starts run when more than one design is requested (at least one per design)
+OPTIMISE_STARTS = 4
+
+# Minimum number of differing positions between any two designs returned by a multi-start optimisation
+OPTIMISE_MIN_DESIGN_DISTANCE = 3
+
+# Optimisation requests run as background jobs on this many threads per web process
+OPTIMISE_JOB_THREADS = 2
+
+# A running optimisation job is cancelled once nobody has watched its progress page for this many seconds
+# (None never cancels on disconnect)
+OPTIMISE_CANCEL_UNWATCHED_AFTER = 10
+
+# Number of finished optimisation jobs kept so identical resubmissions return at once
+OPTIMISE_JOBS_KEPT = 1000
+
+# Optimisations waiting for a job thread beyond which new ones are refused with a 429, and the Retry-After
+# (seconds) sent with it
+OPTIMISE_MAX_QUEUED_JOBS = 20
+OPTIMISE_RETRY_AFTER = 30
+
+# Async views score predictions on this many worker processes, with at most OFFLOAD_MAX_QUEUED more waiting;
+# further requests get a 429 with Retry-After OFFLOAD_RETRY_AFTER seconds
+OFFLOAD_WORKERS = 2
+OFFLOAD_MAX_QUEUED = 32
+OFFLOAD_RETRY_AFTER = 2
+
+# Prediction and optimisation results are reused across requests for RESULT_CACHE_TIMEOUT seconds, keeping at
+# most RESULT_CACHE_MAX_ENTRIES of them. The local-memory cache is per process; a file-based cache
+# ("django.core.cache.backends.filebased.FileBasedCache" with a directory as LOCATION) is shared by all processes.
+RESULT_CACHE_ALIAS = "results"
+RESULT_CACHE_TIMEOUT = 24 * 60 * 60
+RESULT_CACHE_MAX_ENTRIES = 10000
+
+# Largest JSON API request, in sequences (or optimisations) and in bytes once any gzip compression is undone
+API_MAX_SEQUENCES = 10000
+API_MAX_BODY_SIZE = 20 * 1024 * 1024
+
+CACHES = {
+    "default": {
+        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+    },
+    RESULT_CACHE_ALIAS: {
+        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+        "LOCATION": "synthopedia-results",
+        "TIMEOUT": RESULT_CACHE_TIMEOUT,
+        "OPTIONS": {"MAX_ENTRIES": RESULT_CACHE_MAX_ENTRIES},
+    },
+}
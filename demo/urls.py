@@ -16,7 +16,11 @@ Including another URLconf
 from django.contrib import admin
 from django.urls import path, include
 
+from myapp import views
+
 urlpatterns = [
     path('admin/', admin.site.urls),
-    path("myapp/", include("myapp.urls"))
+    path("myapp/", include("myapp.urls")),
+    path("api/", include("myapp.api_urls")),
+    path("metrics", views.show_metrics, name="metrics") # Where Prometheus scrapes by default
 ]
@@ -0,0 +1,85 @@
+import itertools
+import os
+import threading
+
+import RNA
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+
+# Every window find_spacing scores is an 8-mer against an 8 nt rRNA tail, so all of its energies fit in 4**8 entries
+window_length = 8
+bases = "ACGU"
+
+table_dir = os.environ.get("SYNTHOPEDIA_ENERGY_TABLE_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), "energy_tables"))
+lazy_build = os.environ.get("SYNTHOPEDIA_ENERGY_TABLE_LAZY_BUILD", "1") != "0"
+lazy_build_keys = None # (rRNA, temperature) pairs whose tables may be built on first use, or None for any; see configure()
+
+base_codes = np.full(256, 255, dtype=np.uint8)
+for code, base in enumerate(bases):
+    base_codes[ord(base)] = code
+place_values = 4 ** np.arange(window_length - 1, -1, -1)
+
+build_locks = {} # table path -> lock, so each table is built once without holding up builds of other tables
+build_locks_lock = threading.Lock()
+
+
+def configure(keys):
+
+    # A web server limits lazy building to the chassis it expects: a build takes seconds and leaves another table
+    # on disk, so other tails and temperatures from requests fold their windows one by one instead
+    global lazy_build_keys
+    lazy_build_keys = {(rRNA.upper().replace("T","U")[-window_length:], float(temp)) for rRNA, temp in keys} if keys is not None else None
+
+
+def find_table_path(rRNA, temp):
+
+    return os.path.join(table_dir, f"{rRNA}_{float(temp):g}C_vienna{RNA.__version__}.npy")
+
+
+def find_window_indices(rbs):
+
+    # Table index of every window of the RBS, or None if a window contains anything other than A, C, G or U
+    codes = base_codes[np.frombuffer(rbs.encode(), dtype=np.uint8)]
+    if len(codes) < window_length or (codes == 255).any():
+        return None
+
+    return sliding_window_view(codes.astype(np.int64), window_length) @ place_values
+
+
+def build_energy_table(rRNA, temp, md):
+
+    table = np.empty(4 ** window_length, dtype=np.float32)
+
+    # itertools.product walks the windows in the same order as their base-4 indices
+    for index, window in enumerate(itertools.product(bases, repeat=window_length)):
+        structure, energy = RNA.fold_compound(f"{rRNA}&{''.join(window)}", md).mfe_dimer()
+        table[index] = energy
+
+    path = find_table_path(rRNA, temp)
+    os.makedirs(table_dir, exist_ok=True)
+    temp_path = f"{path}.{os.getpid()}.tmp"
+    with open(temp_path, "wb") as f:
+        np.save(f, table)
+    os.replace(temp_path, path)
+
+    return path
+
+
+def load_energy_table(rRNA, temp, md, build=None):
+
+    if len(rRNA) != window_length or find_window_indices(rRNA) is None:
+        return None
+    if build is None:
+        build = lazy_build and (lazy_build_keys is None or (rRNA, float(temp)) in lazy_build_keys)
+
+    path = find_table_path(rRNA, temp)
+    if not os.path.exists(path):
+        if not build:
+            return None
+        with build_locks_lock:
+            build_lock = build_locks.setdefault(path, threading.Lock())
+        with build_lock:
+            if not os.path.exists(path):
+                build_energy_table(rRNA, temp, md)
+
+    return np.load(path, mmap_mode="r")
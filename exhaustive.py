@@ -0,0 +1,233 @@
+import numpy as np
+
+import stopping
+from flat_forest import FlatForest
+from hybridisation import find_spacing_penalty, get_hybridisation_engine
+from model_registry import get_model, get_predictor
+from population_pool import get_pool, run_recorded, split_batch, unpack_recorded
+from predict import find_accessibility_score, find_codon_score, find_standby_score, find_tir
+
+# Spaces of up to 4**max_free_positions candidates are small enough to enumerate. Every distinct last 27 nt costs a
+# fold, so "auto" only searches exhaustively when at most max_folded_positions of the free positions lie there.
+max_free_positions = 8
+max_folded_positions = 6
+
+bases = "ACGU"
+
+
+def find_free_positions(rbs, positions_to_protect):
+
+    return [i for i in range(len(rbs)) if i not in positions_to_protect]
+
+
+def is_exhaustive_search_small(rbs, free_positions):
+
+    folded = [p for p in free_positions if p >= len(rbs) - len(rbs[-27:])]
+    return len(free_positions) <= max_free_positions and len(folded) <= max_folded_positions
+
+
+def find_candidate_codes(rbs, free_positions):
+
+    # Base codes of every candidate, in the order itertools.product would list the free positions' bases
+    count = 4 ** len(free_positions)
+    choices = np.arange(count)[:, None] // 4 ** np.arange(len(free_positions) - 1, -1, -1) % 4
+    codes = np.tile(np.frombuffer(rbs.encode(), dtype=np.uint8), (count, 1))
+    codes[:, free_positions] = np.frombuffer(bases.encode(), dtype=np.uint8)[choices]
+
+    return codes, choices
+
+
+def find_subset_index(choices, subset):
+
+    # Index of each candidate's bases at the given free positions, among the 4**len(subset) possibilities
+    return choices[:, subset] @ 4 ** np.arange(len(subset) - 1, -1, -1) if subset else np.zeros(len(choices), dtype=np.int64)
+
+
+class ExhaustiveSearch:
+    # Scores every way of filling an RBS's free positions, exactly as find_tir would. Everything but the
+    # accessibility fold is computed for all candidates at once; candidates sharing the last 27 nt share a fold,
+    # and a group is only folded if the forest could predict a rate for it closer to the target than the best so far.
+
+    def __init__(self, gram_stain, temperature, rRNA, rbs, CDS, free_positions):
+        if len(free_positions) > max_free_positions:
+            raise ValueError(f"Too many unprotected positions to search exhaustively: {len(free_positions)} > {max_free_positions}")
+        self.gram_stain = gram_stain
+        self.temperature = temperature
+        self.rbs = rbs
+        self.CDS = CDS
+        self.engine = get_hybridisation_engine(rRNA, temperature)
+        self.codes, self.choices = find_candidate_codes(rbs, free_positions)
+        self.free_positions = free_positions
+
+    def find_candidate(self, i):
+
+        return self.codes[i].tobytes().decode()
+
+    def find_binding_features(self):
+
+        # Vectorised find_spacing, find_au_score and rbs.index(sd) for every candidate
+        length = len(self.engine.rRNA)
+        windows = len(self.rbs) - length + 1
+        count = len(self.codes)
+        energies = np.zeros((count, max(windows, 0)))
+        window_ids = np.zeros((count, max(windows, 0)), dtype=np.int64)
+        ids = {}
+
+        for w in range(windows):
+            subset = [j for j, p in enumerate(self.free_positions) if w <= p < w + length]
+            index = find_subset_index(self.choices, subset)
+            firsts = np.unique(index, return_index=True)[1]
+            window_energies = np.empty(len(firsts))
+            window_ids_w = np.empty(len(firsts), dtype=np.int64)
+            for combination, i in enumerate(firsts):
+                window = self.find_candidate(i)[w:w+length]
+                window_energies[combination] = self.engine.find_hybridization_energy(window)
+                window_ids_w[combination] = ids.setdefault(window, len(ids))
+            energies[:, w] = window_energies[index]
+            window_ids[:, w] = window_ids_w[index]
+
+        penalties = np.array([find_spacing_penalty(len(self.rbs) - w - length, self.gram_stain) for w in range(windows)], dtype=np.float64)
+        penalised = energies * penalties
+        lowest = penalised.min(axis=1) if windows > 0 else np.full(count, np.inf)
+        has_sd = lowest <= 0
+
+        # find_spacing keeps the last window with the lowest penalised energy; rbs.index(sd) finds its first copy
+        # and without any window at or below zero the SD is "" at position 0 with spacing 0
+        rows = np.arange(count)
+        sd_window = np.zeros(count, dtype=np.int64)
+        sd_loc = np.zeros(count, dtype=np.int64)
+        binding_energy = np.zeros(count)
+        if has_sd.any():
+            sd_window[has_sd] = windows - 1 - np.argmax((penalised[has_sd] == lowest[has_sd, None])[:, ::-1], axis=1)
+            sd_loc[has_sd] = np.argmax(window_ids[has_sd] == window_ids[rows[has_sd], sd_window[has_sd]][:, None], axis=1)
+            binding_energy[has_sd] = energies[rows[has_sd], sd_window[has_sd]]
+        if not has_sd.all():
+            binding_energy[~has_sd] = self.engine.find_hybridization_energy("")
+        spacing = np.where(has_sd, len(self.rbs) - sd_window - length, 0)
+
+        au_score = np.zeros(count)
+        is_au = (self.codes == ord("A")) | (self.codes == ord("U"))
+        for loc in np.unique(sd_loc):
+            upstream = list(range(len(self.rbs))[loc-11:loc])
+            if upstream:
+                au_score[sd_loc == loc] = is_au[sd_loc == loc][:, upstream].sum(axis=1) / len(upstream)
+
+        self.has_sd, self.sd_window, self.sd_loc = has_sd, sd_window, sd_loc
+        return binding_energy, spacing.astype(np.float64), au_score
+
+    def find_sd(self, i):
+
+        length = len(self.engine.rRNA)
+        return self.find_candidate(i)[self.sd_window[i]:self.sd_window[i]+length] if self.has_sd[i] else ""
+
+    def find_fold_features(self, members, fold):
+
+        # Accessibility, folding energy and standby score of candidates whose last 27 nt share one fold
+        structure, accessibility_score, folding_energy = fold
+        standby = {}
+        for i in members:
+            if self.sd_loc[i] not in standby:
+                standby[self.sd_loc[i]] = find_standby_score(self.find_candidate(i), self.find_sd(i), structure)
+
+        return np.column_stack([np.full(len(members), accessibility_score), np.full(len(members), folding_energy), [standby[loc] for loc in self.sd_loc[members]]])
+
+    def search(self, desired_initiation_rate, criteria, callback=None, workers=None, chunk_size=64):
+
+        # Returns the candidates scored, their rates, the best candidate, its rate and why the search stopped.
+        # Groups are folded chunk_size at a time, across the process pool when workers > 1.
+        predictor = get_predictor()
+        forest = predictor if isinstance(predictor, FlatForest) else FlatForest.from_sklearn(get_model())
+        binding_energy, spacing, au_score = self.find_binding_features()
+        count = len(self.codes)
+        fixed = np.tile([find_codon_score(self.CDS), 0 if self.gram_stain == "Negative" else 1], (count, 1))
+
+        # The fold sees only the last 27 nt, so candidates agreeing there share accessibility features
+        tail_start = len(self.rbs) - len(self.rbs[-27:])
+        group = find_subset_index(self.choices, [j for j, p in enumerate(self.free_positions) if p >= tail_start])
+        groups, firsts = np.unique(group, return_index=True)
+
+        # Optimistic deviation of each candidate with its accessibility, folding energy and standby score unknown
+        binding = np.column_stack([binding_energy, spacing, au_score])
+        _, boxes, box_index = np.unique(binding, axis=0, return_index=True, return_inverse=True)
+        lowest, highest = forest.find_prediction_bounds(np.column_stack([binding, np.zeros(count), np.full(count, -np.inf), np.zeros(count), fixed])[boxes],
+                                                        np.column_stack([binding, np.ones(count), np.zeros(count), np.ones(count), fixed])[boxes])
+        bound = np.maximum(np.maximum(lowest - desired_initiation_rate, desired_initiation_rate - highest), 0)[box_index.ravel()]
+        group_bound = np.full(groups.max() + 1, np.inf)
+        np.minimum.at(group_bound, group, bound)
+
+        # Groups are searched in order of how close they come to the target with the input RBS's fold, so a
+        # near-target candidate is usually found early and the bound can rule out the rest
+        everyone = np.arange(count)
+        estimate = np.abs(predictor.predict(np.column_stack([binding, self.find_fold_features(everyone, find_accessibility_score(self.rbs, self.CDS, "", self.temperature)), fixed])) - desired_initiation_rate)
+        group_estimate = np.full(groups.max() + 1, np.inf)
+        np.minimum.at(group_estimate, group, estimate)
+        order = groups[np.lexsort((group_bound[groups], group_estimate[groups]))]
+        remaining_bound = np.minimum.accumulate(group_bound[order][::-1])[::-1]
+
+        scored, rates = [], []
+        best, best_rate, best_deviation = None, None, np.inf
+        evaluations = 0
+        stop_reason = stopping.search_completed
+
+        for start in range(0, len(order), chunk_size):
+            # Checked before anything is folded as well, so cancellation, the deadline or an exhausted budget stop
+            # the search even while it has not scored a candidate yet
+            reason = criteria.find_stop_reason(best_rate, evaluations)
+            if reason is not None:
+                stop_reason = reason
+                break
+            if remaining_bound[start] >= best_deviation:
+                break # Every group left is bounded at least this far from the target
+
+            chunk = [g for g in order[start:start+chunk_size] if group_bound[g] < best_deviation]
+            if not chunk:
+                continue
+            folds = find_folds_parallel([self.find_candidate(firsts[np.searchsorted(groups, g)]) for g in chunk], self.CDS, self.temperature, workers)
+
+            members = [np.flatnonzero((group == g) & (bound < best_deviation)) for g in chunk]
+            features = np.vstack([np.column_stack([binding[m], self.find_fold_features(m, fold), fixed[m]]) for m, fold in zip(members, folds)])
+            members = np.concatenate(members)
+            keep = criteria.find_remaining_evaluations(evaluations, len(members))
+            members, chunk_rates = members[:keep], predictor.predict(features[:keep]) if keep else np.empty(0)
+            evaluations += len(members)
+            scored.extend(self.find_candidate(i) for i in members)
+            rates.extend(chunk_rates)
+
+            if len(members):
+                deviations = np.abs(chunk_rates - desired_initiation_rate)
+                if deviations.min() < best_deviation:
+                    best_deviation = deviations.min()
+                    best, best_rate = self.find_candidate(members[np.argmin(deviations)]), chunk_rates[np.argmin(deviations)]
+
+            if best is None:
+                continue
+            if callback is not None:
+                callback({"generation": min(start + chunk_size, len(order)), "generations": len(order), "best_rate": float(best_rate), "best_sequence": best, "evaluations": evaluations})
+
+            reason = criteria.find_stop_reason(best_rate, evaluations)
+            if reason is not None:
+                stop_reason = reason
+                break
+
+        if best is None:
+            # Stopped before scoring anything, so the input RBS is returned with its rate
+            best, best_rate = self.rbs, find_tir(self.gram_stain, self.temperature, self.engine.rRNA, self.rbs, self.CDS)
+            scored.append(best)
+            rates.append(best_rate)
+
+        return scored, rates, best, best_rate, stop_reason
+
+
+def find_folds(rbs_list, CDS, temperature):
+
+    return [find_accessibility_score(rbs, CDS, "", temperature) for rbs in rbs_list]
+
+
+def find_folds_parallel(rbs_list, CDS, temperature, workers=None):
+
+    if not workers or workers < 2 or len(rbs_list) < 2:
+        return find_folds(rbs_list, CDS, temperature)
+
+    futures = [get_pool(workers).submit(run_recorded, find_folds, chunk, CDS, temperature) for chunk in split_batch(rbs_list, workers)]
+
+    return [fold for future in futures for fold in unpack_recorded(future.result())]
@@ -0,0 +1,160 @@
+"""Resumable, parallel feature extraction for the training and evaluation datasets.
+
+Rows are split into shards that are scored on a process pool. Each finished shard is written to its own Feather
+file under the cache directory, keyed by a hash of the row's inputs, so an interrupted run picks up where it
+stopped and a rerun only computes rows it has not seen. Changing how a feature is computed must bump
+feature_version, which moves the cache to a fresh directory.
+
+    python feature_pipeline.py "model_files/Dataset - Reis and Salis - 16779.csv" features-16779.feather --workers 8
+"""
+import argparse
+import glob
+import hashlib
+import os
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from functools import partial
+
+import RNA
+import pandas as pd
+
+from hybridisation import get_hybridisation_engine
+from predict import codon_scores, find_au_score, find_spacing, find_structure
+from structure_scores import encode_structures, find_accessibility_scores, find_standby_scores
+
+feature_version = f"1-vienna{RNA.__version__}"
+
+default_cache_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), "feature_cache")
+
+# The model was trained with GAA scored 2.12; predict.py scores it 2.02. Training features keep the training value.
+training_codon_scores = dict(codon_scores, GAA=2.12)
+
+feature_columns = ["Binding energy", "Shine-Dalgarno", "Spacing", "AU score", "Structure", "Accessibility score", "Folding energy", "Standby accessibility", "Codon score", "Gram stain numeric"]
+
+
+def normalise(sequence):
+
+    return sequence.strip().upper().replace("T","U")
+
+
+def find_row_hash(*values):
+
+    return hashlib.sha256("\t".join(str(value) for value in values).encode()).hexdigest()
+
+
+def find_feature_rows(rows):
+
+    # rows are (gram stain, temperature, rRNA, RBS, CDS) with sequences normalised and rRNA truncated to 8 nt
+    scored, structures, sd_locs = [], [], []
+    for gram_stain, temperature, rRNA, RBS, CDS in rows:
+        binding_energy, sd, spacing = find_spacing(rRNA, RBS, temperature, gram_stain)
+        structure, folding_energy = find_structure(RBS, CDS, temperature)
+        scored.append([binding_energy, sd, spacing, find_au_score(RBS, sd), structure, folding_energy, training_codon_scores[CDS[:3]], 0 if gram_stain == "Negative" else 1])
+        structures.append(structure)
+        sd_locs.append(RBS.index(sd))
+
+    matrix, lengths = encode_structures(structures)
+    accessibility_scores = find_accessibility_scores(matrix)
+    standby_scores = find_standby_scores(matrix, lengths, sd_locs)
+
+    return [[binding_energy, sd, spacing, au_score, structure, accessibility_score, folding_energy, standby_accessibility, codon_score, gram_stain_numeric]
+            for (binding_energy, sd, spacing, au_score, structure, folding_energy, codon_score, gram_stain_numeric), accessibility_score, standby_accessibility
+            in zip(scored, accessibility_scores.tolist(), standby_scores.tolist())]
+
+
+def find_binding_scan_rows(rows, lengths):
+
+    # The training script's rRNA-length scan: the strongest binding of the last n nt of the rRNA to any window,
+    # for every n, from one pass over each row. rows are (temperature, rRNA, RBS) with sequences normalised.
+    scanned = []
+    for temperature, rRNA, RBS in rows:
+        energies = []
+        for length in lengths:
+            window_energies = get_hybridisation_engine(rRNA[-length:], temperature).find_window_energies(RBS)
+            energies.append(abs(min([0] + [energy for energy in window_energies])))
+        scanned.append(energies)
+
+    return scanned
+
+
+def run_pipeline(keys, inputs, compute, columns, name, cache_dir=None, workers=None, shard_size=500):
+
+    # compute(list of inputs) returns one list of column values per input; results come back aligned with keys
+    cache_dir = os.path.join(cache_dir or default_cache_dir, f"{name}-{feature_version}")
+    os.makedirs(cache_dir, exist_ok=True)
+
+    frames = [pd.read_feather(path).set_index("Row hash") for path in sorted(glob.glob(os.path.join(cache_dir, "*.feather")))]
+    done = set().union(*(frame.index for frame in frames))
+
+    missing = {}
+    for key, row in zip(keys, inputs):
+        if key not in done and key not in missing:
+            missing[key] = row
+    missing_keys = list(missing)
+    shards = [missing_keys[i:i+shard_size] for i in range(0, len(missing_keys), shard_size)]
+
+    def save(shard, values):
+        frame = pd.DataFrame(values, columns=columns)
+        frame.insert(0, "Row hash", shard)
+        path = os.path.join(cache_dir, f"{shard[0]}.feather")
+        frame.to_feather(f"{path}.{os.getpid()}.tmp")
+        os.replace(f"{path}.{os.getpid()}.tmp", path) # A shard is either complete on disk or absent
+        return frame.set_index("Row hash")
+
+    if workers is not None and workers > 1 and len(shards) > 1:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            futures = {executor.submit(compute, [missing[key] for key in shard]): shard for shard in shards}
+            for future in as_completed(futures):
+                frames.append(save(futures[future], future.result()))
+    else:
+        for shard in shards:
+            frames.append(save(shard, compute([missing[key] for key in shard])))
+
+    if not frames:
+        return pd.DataFrame(columns=columns)
+    results = pd.concat(frames)
+    results = results[~results.index.duplicated()]
+    return results.loc[list(keys), columns].reset_index(drop=True)
+
+
+def extract_features(df, cache_dir=None, workers=None, shard_size=500):
+
+    # The feature columns of the training script (plus the Shine-Dalgarno sequence and structure) for every row of a
+    # dataset with Gram stain, Temperature, rRNA, RBS and CDS columns, aligned with df's rows
+    inputs = [(gram_stain.strip(), float(temperature), normalise(rRNA)[-8:], normalise(RBS), normalise(CDS))
+              for gram_stain, temperature, rRNA, RBS, CDS in zip(df["Gram stain"], df["Temperature"], df["rRNA"], df["RBS"], df["CDS"])]
+    keys = [find_row_hash(*row) for row in inputs]
+
+    features = run_pipeline(keys, inputs, find_feature_rows, feature_columns, "features", cache_dir, workers, shard_size)
+    features.index = df.index
+    return features
+
+
+def extract_binding_scan(df, lengths=range(4, 10), cache_dir=None, workers=None, shard_size=500):
+
+    # "Binding energy (n nt)" for each rRNA tail length n, aligned with df's rows
+    lengths = list(lengths)
+    inputs = [(float(temperature), normalise(rRNA), normalise(RBS)) for temperature, rRNA, RBS in zip(df["Temperature"], df["rRNA"], df["RBS"])]
+    keys = [find_row_hash(*row) for row in inputs]
+    columns = [f"Binding energy ({length} nt)" for length in lengths]
+
+    scan = run_pipeline(keys, inputs, partial(find_binding_scan_rows, lengths=lengths), columns, "binding-scan-" + "-".join(map(str, lengths)), cache_dir, workers, shard_size)
+    scan.index = df.index
+    return scan
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compute (or resume computing) training features for a dataset")
+    parser.add_argument("input", help="CSV with Gram stain, Temperature, rRNA, RBS and CDS columns")
+    parser.add_argument("output", help="Feather file for the input columns plus the feature columns")
+    parser.add_argument("--workers", type=int, default=os.cpu_count())
+    parser.add_argument("--shard-size", type=int, default=500)
+    parser.add_argument("--cache-dir", default=None)
+    parser.add_argument("--binding-scan", action="store_true", help="Also add the rRNA length scan columns")
+    args = parser.parse_args()
+
+    df = pd.read_csv(args.input)
+    frames = [df, extract_features(df, args.cache_dir, args.workers, args.shard_size)]
+    if args.binding_scan:
+        frames.append(extract_binding_scan(df, cache_dir=args.cache_dir, workers=args.workers, shard_size=args.shard_size))
+    pd.concat(frames, axis=1).to_feather(args.output)
+    print(f"Wrote features for {len(df)} rows to {args.output}")
@@ -0,0 +1,60 @@
+"""Versioned on-disk store of model-ready datasets: the feature matrix, the targets and a fingerprint of the
+dataset they came from, so model selection can be rerun without recomputing any features.
+
+Each entry is a Feather file with the features and targets side by side, and a JSON file next to it recording
+the feature version, the dataset fingerprint and which columns are features and which are targets. An entry is
+only returned when both match what the caller expects.
+"""
+import hashlib
+import json
+import os
+
+import pandas as pd
+
+from feature_pipeline import feature_version
+
+default_store_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), "feature_store")
+
+
+def find_dataset_fingerprint(df):
+
+    # Stable across reads of the same file: hashes the values of every column, in order
+    return hashlib.sha256(pd.util.hash_pandas_object(df, index=False).values.tobytes() + json.dumps(list(df.columns)).encode()).hexdigest()
+
+
+def find_entry_path(name, store_dir=None):
+
+    return os.path.join(store_dir or default_store_dir, f"{name}-{feature_version}")
+
+
+def save_features(name, X, y, fingerprint, store_dir=None):
+
+    path = find_entry_path(name, store_dir)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    y = y.to_frame() if isinstance(y, pd.Series) else y
+    frame = pd.concat([X.reset_index(drop=True), y.reset_index(drop=True)], axis=1)
+
+    frame.to_feather(f"{path}.feather.{os.getpid()}.tmp")
+    os.replace(f"{path}.feather.{os.getpid()}.tmp", f"{path}.feather")
+    with open(f"{path}.json.{os.getpid()}.tmp", "w") as f:
+        json.dump({"feature_version": feature_version, "fingerprint": fingerprint, "features": list(X.columns), "targets": list(y.columns), "rows": len(frame)}, f, indent=2)
+    os.replace(f"{path}.json.{os.getpid()}.tmp", f"{path}.json")
+
+    return path
+
+
+def load_features(name, fingerprint=None, store_dir=None):
+
+    # Returns (X, y), or None if there is no entry for this feature version or it was built from other data
+    path = find_entry_path(name, store_dir)
+    try:
+        with open(f"{path}.json") as f:
+            metadata = json.load(f)
+        frame = pd.read_feather(f"{path}.feather")
+    except FileNotFoundError:
+        return None
+
+    if metadata["feature_version"] != feature_version or (fingerprint is not None and metadata["fingerprint"] != fingerprint):
+        return None
+
+    return frame[metadata["features"]], frame[metadata["targets"]]
@@ -0,0 +1,141 @@
+import numpy as np
+
+# One record per node of every tree, concatenated tree after tree. Child indices are global and -1 marks a leaf.
+node_dtype = np.dtype([("feature", np.int32), ("threshold", np.float64), ("left", np.int32), ("right", np.int32), ("value", np.float64), ("root", np.bool_)])
+
+
+class FlatForest:
+    # Flattened RandomForestRegressor that predicts a whole batch with vectorised NumPy traversal
+
+    def __init__(self, nodes):
+        self.nodes = nodes
+        self.feature = np.ascontiguousarray(np.maximum(nodes["feature"], 0))
+        self.threshold = np.ascontiguousarray(nodes["threshold"])
+        self.left = np.ascontiguousarray(nodes["left"])
+        self.right = np.ascontiguousarray(nodes["right"])
+        self.value = np.ascontiguousarray(nodes["value"])
+        self.roots = np.flatnonzero(nodes["root"])
+        self.tree = np.cumsum(nodes["root"]) - 1 # Tree each node belongs to
+
+    @classmethod
+    def from_sklearn(cls, forest):
+
+        trees = [estimator.tree_ for estimator in forest.estimators_]
+        nodes = np.zeros(sum(tree.node_count for tree in trees), dtype=node_dtype)
+
+        offset = 0
+        for tree in trees:
+            tree_nodes = nodes[offset:offset+tree.node_count]
+            tree_nodes["feature"] = tree.feature
+            tree_nodes["threshold"] = tree.threshold
+            tree_nodes["left"] = np.where(tree.children_left == -1, -1, tree.children_left + offset)
+            tree_nodes["right"] = np.where(tree.children_right == -1, -1, tree.children_right + offset)
+            tree_nodes["value"] = tree.value[:, 0, 0]
+            tree_nodes["root"][0] = True
+            offset += tree.node_count
+
+        return cls(nodes)
+
+    @classmethod
+    def load(cls, path, mmap_mode=None):
+
+        return cls(np.load(path, mmap_mode=mmap_mode))
+
+    def save(self, path):
+
+        np.save(path, self.nodes)
+
+    def find_leaves(self, X):
+
+        # Like sklearn, compare float32 features against float64 thresholds
+        X = np.asarray(X, dtype=np.float32).astype(np.float64)
+        n_features = X.shape[1]
+        X = X.ravel()
+
+        # One cursor per (row, tree); only cursors still on internal nodes are advanced each step
+        nodes = np.tile(self.roots, len(X) // n_features)
+        offsets = np.repeat(np.arange(0, len(X), n_features), len(self.roots))
+        active = np.arange(len(nodes))
+
+        while len(active):
+            current = nodes[active]
+            left = self.left[current]
+            internal = left != -1
+            active, current, left = active[internal], current[internal], left[internal]
+            go_left = X[offsets[active] + self.feature[current]] <= self.threshold[current]
+            nodes[active] = np.where(go_left, left, self.right[current])
+
+        return nodes.reshape(-1, len(self.roots))
+
+    def predict(self, X):
+
+        X = np.asarray(X).reshape(len(X), -1)
+        if len(X) == 0:
+            return np.empty(0)
+
+        values = self.value[self.find_leaves(X)]
+
+        # Trees are summed one at a time in order, as RandomForestRegressor.predict does, so results match it bit for bit
+        prediction = np.zeros(len(X), dtype=np.float64)
+        for tree in range(values.shape[1]):
+            prediction += values[:, tree]
+
+        return prediction / values.shape[1]
+
+    def find_prediction_bounds(self, lower, upper):
+
+        # Smallest and largest prediction of any feature vector inside each box lower <= x <= upper (bounds may be
+        # infinite). A tree's value ranges over every leaf the box reaches; at a point box this is predict itself.
+        lower = np.asarray(lower, dtype=np.float32).astype(np.float64)
+        upper = np.asarray(upper, dtype=np.float32).astype(np.float64)
+        n_features = lower.shape[1]
+        lower, upper = lower.ravel(), upper.ravel()
+
+        boxes = np.repeat(np.arange(len(lower) // n_features), len(self.roots))
+        nodes = np.tile(self.roots, len(lower) // n_features)
+        smallest = np.full((len(lower) // n_features, len(self.roots)), np.inf)
+        largest = np.full((len(lower) // n_features, len(self.roots)), -np.inf)
+
+        while len(nodes):
+            leaf = self.left[nodes] == -1
+            np.minimum.at(smallest, (boxes[leaf], self.tree[nodes[leaf]]), self.value[nodes[leaf]])
+            np.maximum.at(largest, (boxes[leaf], self.tree[nodes[leaf]]), self.value[nodes[leaf]])
+            boxes, nodes = boxes[~leaf], nodes[~leaf]
+            offsets = boxes * n_features + self.feature[nodes]
+            go_left = lower[offsets] <= self.threshold[nodes]
+            go_right = upper[offsets] > self.threshold[nodes]
+            boxes = np.concatenate([boxes[go_left], boxes[go_right]])
+            nodes = np.concatenate([self.left[nodes[go_left]], self.right[nodes[go_right]]])
+
+        # Summed tree by tree like predict, so rounding can't move a bound past a prediction inside the box
+        lowest = np.zeros(len(smallest), dtype=np.float64)
+        highest = np.zeros(len(largest), dtype=np.float64)
+        for tree in range(len(self.roots)):
+            lowest += smallest[:, tree]
+            highest += largest[:, tree]
+
+        return lowest / len(self.roots), highest / len(self.roots)
+
+
+if __name__ == "__main__":
+    # Export the model to a flat forest file and check it against the sklearn model on the Reis & Salis dataset
+    import os
+    import sys
+
+    import pandas as pd
+
+    import model_registry
+    from predict import feature_columns, find_features
+
+    path = sys.argv[1] if len(sys.argv) > 1 else os.path.splitext(model_registry.model_path)[0] + ".flat.npy"
+    model = model_registry.get_model()
+    flat_forest = FlatForest.from_sklearn(model)
+    flat_forest.save(path)
+
+    df = pd.read_csv(os.path.join(os.path.dirname(os.path.abspath(__file__)), "model_files", "Dataset - Reis and Salis - 1014.csv"))
+    features = np.array([find_features(row["Gram stain"], row["Temperature"], row["rRNA"].upper().replace("T","U")[-8:], row["RBS"].upper().replace("T","U"), row["CDS"].upper().replace("T","U")) for _, row in df.iterrows()])
+    expected = model.predict(pd.DataFrame(features, columns=feature_columns))
+    difference = np.abs(FlatForest.load(path, mmap_mode="r").predict(features) - expected).max()
+
+    print(f"Saved {len(flat_forest.nodes)} nodes to {path}; largest difference from model.predict over {len(df)} rows: {difference:.3g}")
+    sys.exit(0 if difference <= 1e-9 else 1)
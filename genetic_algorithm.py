@@ -0,0 +1,75 @@
+import random
+
+import stopping
+
+
+def find_deviation(rate, desired_initiation_rate):
+
+    return abs(rate - desired_initiation_rate)
+
+
+def select_by_tournament(rates, desired_initiation_rate, tournament_size, rng):
+
+    # The fittest of a few randomly drawn individuals becomes a parent
+    contenders = rng.sample(range(len(rates)), min(tournament_size, len(rates)))
+
+    return min(contenders, key=lambda i: find_deviation(rates[i], desired_initiation_rate))
+
+
+def run_genetic_algorithm(score, desired_initiation_rate, rbs, positions_to_protect, mutate, crossover, generations=100, population_size=50, offspring_size=150, elite_size=5, tournament_size=3, mutation_rate=0.1, criteria=None, rng=random, callback=None):
+
+    # score(rbs_list, parent) returns the rates of rbs_list; parent is a close relative the scorer may evaluate them against
+    if criteria is None:
+        criteria = stopping.StoppingCriteria(desired_initiation_rate)
+
+    population_size = max(criteria.find_remaining_evaluations(0, population_size), 1)
+    population = [rbs] + [mutate(rbs, mutation_rate, positions_to_protect, rng=rng) for _ in range(population_size - 1)]
+    rates = list(score(population, rbs))
+    evaluations = len(population)
+
+    best_rbs, best_rate = rbs, rates[0]
+
+    for generation in range(generations):
+        ranking = sorted(range(len(population)), key=lambda i: find_deviation(rates[i], desired_initiation_rate))
+        if find_deviation(rates[ranking[0]], desired_initiation_rate) < find_deviation(best_rate, desired_initiation_rate):
+            best_rbs, best_rate = population[ranking[0]], rates[ranking[0]]
+
+        if callback is not None:
+            callback({"generation": generation+1, "generations": generations, "best_rate": float(best_rate), "best_sequence": best_rbs, "evaluations": evaluations})
+
+        stop_reason = criteria.find_stop_reason(best_rate, evaluations)
+        if stop_reason is not None:
+            break
+
+        # Offspring are bred from tournament-selected parents by crossover, then mutated
+        offspring = []
+        while len(offspring) < offspring_size:
+            parents = [population[select_by_tournament(rates, desired_initiation_rate, tournament_size, rng)] for _ in range(4)]
+            children = crossover(parents, 0, 1, 2, 3, rng=rng) if len(rbs) > 1 else parents
+            offspring.extend(mutate(child, mutation_rate, positions_to_protect, rng=rng) for child in children)
+        offspring = offspring[:criteria.find_remaining_evaluations(evaluations, offspring_size)]
+        try:
+            offspring_rates = list(score(offspring, population[ranking[0]]))
+        except stopping.Cancelled:
+            stop_reason = stopping.cancelled
+            break
+        evaluations += len(offspring)
+
+        # The elite survive unchanged; the rest of the next population are the fittest distinct offspring
+        next_population = [population[i] for i in ranking[:elite_size]]
+        next_rates = [rates[i] for i in ranking[:elite_size]]
+        for i in sorted(range(len(offspring)), key=lambda i: find_deviation(offspring_rates[i], desired_initiation_rate)):
+            if len(next_population) == population_size:
+                break
+            if offspring[i] not in next_population:
+                next_population.append(offspring[i])
+                next_rates.append(offspring_rates[i])
+        population, rates = next_population, next_rates
+
+    else:
+        ranking = sorted(range(len(population)), key=lambda i: find_deviation(rates[i], desired_initiation_rate))
+        if find_deviation(rates[ranking[0]], desired_initiation_rate) < find_deviation(best_rate, desired_initiation_rate):
+            best_rbs, best_rate = population[ranking[0]], rates[ranking[0]]
+        stop_reason = criteria.find_stop_reason(best_rate, evaluations) or stopping.generations_completed
+
+    return best_rbs, best_rate, stop_reason
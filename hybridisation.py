@@ -0,0 +1,112 @@
+from functools import lru_cache
+
+import RNA
+import numpy as np
+
+import energy_table
+
+
+@lru_cache(maxsize=64)
+def model_details(temp):
+
+    # Folding settings are passed to every fold_compound explicitly instead of through the
+    # process-wide RNA.cvar defaults, so calls at different temperatures can run concurrently
+    md = RNA.md()
+    md.temperature = temp
+
+    return md
+
+
+def find_spacing_penalty(spacing, gram):
+
+    penalty = 1
+
+    if gram == "Positive":
+        opt_spacing = 9
+        if spacing < opt_spacing:
+            penalty = np.exp(-0.5*(((spacing - opt_spacing)**2)/1))               # Punishing lower spacing more for Gram-positives
+        elif spacing > opt_spacing:
+            penalty = np.exp(-0.5*(((spacing - opt_spacing)**2)/2))
+    elif gram == "Negative":
+        opt_spacing = 7
+        if spacing < opt_spacing:
+            penalty = np.exp(-0.5*(((spacing - opt_spacing)**2)/2))
+        elif spacing > opt_spacing:
+            penalty = np.exp(-0.5*(((spacing - opt_spacing)**2)/1))               # Punishing higher spacing more for Gram-negatives
+
+    return penalty
+
+
+class HybridisationEngine:
+    # Scores every rRNA-sized window of an RBS against one rRNA tail at one temperature
+
+    def __init__(self, rRNA, temp):
+        self.rRNA = rRNA
+        self.temp = temp
+        self.md = model_details(temp)
+        self.energies = {} # Raw duplex energy of each window folded so far (table lookups aren't kept)
+        self.table = None
+
+        if len(rRNA) == energy_table.window_length:
+            self.table = energy_table.load_energy_table(rRNA, temp, self.md)
+
+    def find_hybridization_energy(self, window):
+
+        indices = energy_table.find_window_indices(window) if self.table is not None else None
+        if indices is not None and len(indices) == 1:
+            return float(self.table[indices[0]])
+
+        energy = self.energies.get(window)
+        if energy is None:
+            structure, energy = RNA.fold_compound(f"{self.rRNA}&{window}", self.md).mfe_dimer()
+            self.energies[window] = energy
+
+        return energy
+
+    def find_window_energies(self, rbs):
+
+        length = len(self.rRNA)
+
+        if self.table is not None:
+            indices = energy_table.find_window_indices(rbs)
+            if indices is not None:
+                return self.table[indices].tolist()
+
+        return [self.find_hybridization_energy(rbs[i:i+length]) for i in range(len(rbs)-length+1)]
+
+    def find_spacing(self, rbs, gram, energies=None):
+
+        length = len(self.rRNA)
+        if energies is None:
+            energies = self.find_window_energies(rbs)
+
+        min_energy = 0
+        sd = ""
+        best_spacing = 0
+        binding_energy = None
+
+        for i, energy in enumerate(energies):
+
+            spacing = len(rbs[i+length:])
+            penalised_energy = energy * find_spacing_penalty(spacing, gram)
+
+            if penalised_energy <= min_energy:
+                min_energy = penalised_energy
+                sd = rbs[i:i+length]
+                best_spacing = spacing
+                binding_energy = energy
+
+        if binding_energy is None:
+            binding_energy = self.find_hybridization_energy(sd)
+
+        return binding_energy, sd, best_spacing
+
+    def find_spacing_batch(self, rbs_list, gram):
+
+        return [self.find_spacing(rbs, gram) for rbs in rbs_list]
+
+
+@lru_cache(maxsize=16)
+def get_hybridisation_engine(rRNA, temp):
+
+    return HybridisationEngine(rRNA, temp)
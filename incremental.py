@@ -0,0 +1,132 @@
+from collections import OrderedDict
+from functools import lru_cache
+
+import metrics
+from hybridisation import get_hybridisation_engine
+from model_registry import get_predictor
+from predict import find_accessibility_score, find_au_score, find_codon_score, find_standby_score
+
+
+class FeatureState:
+    # Everything find_features computes for one RBS, kept so its point mutants can reuse the unaffected parts
+
+    def __init__(self, rbs, energies, binding_energy, sd, spacing, au_score, structure, accessibility_score, folding_energy, standby_accessibility):
+        self.rbs = rbs
+        self.energies = energies
+        self.binding_energy = binding_energy
+        self.sd = sd
+        self.sd_loc = rbs.index(sd)
+        self.spacing = spacing
+        self.au_score = au_score
+        self.structure = structure
+        self.accessibility_score = accessibility_score
+        self.folding_energy = folding_energy
+        self.standby_accessibility = standby_accessibility
+
+
+class IncrementalEvaluator:
+    # Scores RBSs for one chassis and CDS, re-folding only what a mutation can change relative to a parent
+
+    def __init__(self, gram_stain, temperature, rRNA, CDS):
+        self.gram_stain = gram_stain
+        self.temperature = temperature
+        self.CDS = CDS
+        self.engine = get_hybridisation_engine(rRNA, temperature)
+        self.codon_score = find_codon_score(CDS)
+        self.gram_stain_numeric = 0 if gram_stain == "Negative" else 1
+        self.parents = OrderedDict()
+
+    def find_state(self, rbs):
+
+        with metrics.stage("find_spacing"):
+            energies = self.engine.find_window_energies(rbs)
+            binding_energy, sd, spacing = self.engine.find_spacing(rbs, self.gram_stain, energies)
+        structure, accessibility_score, folding_energy = find_accessibility_score(rbs, self.CDS, sd, self.temperature)
+
+        return FeatureState(rbs, energies, binding_energy, sd, spacing, find_au_score(rbs, sd), structure, accessibility_score, folding_energy, find_standby_score(rbs, sd, structure))
+
+    def find_parent_state(self, rbs):
+
+        state = self.parents.get(rbs)
+        if state is None:
+            state = self.parents[rbs] = self.find_state(rbs)
+            if len(self.parents) > 8:
+                self.parents.popitem(last=False)
+
+        return state
+
+    def find_mutant_state(self, parent, rbs):
+
+        if len(rbs) != len(parent.rbs):
+            return self.find_state(rbs)
+
+        mutated = [i for i, (a, b) in enumerate(zip(parent.rbs, rbs)) if a != b]
+        if not mutated:
+            return parent
+
+        # Only windows that contain a mutated position can change their duplex energy
+        with metrics.stage("find_spacing"):
+            window_length = len(self.engine.rRNA)
+            energies = list(parent.energies)
+            changed = {i for p in mutated for i in range(max(p - window_length + 1, 0), min(p + 1, len(energies)))}
+            for i in changed:
+                energies[i] = self.engine.find_hybridization_energy(rbs[i:i+window_length])
+
+            binding_energy, sd, spacing = self.engine.find_spacing(rbs, self.gram_stain, energies)
+        sd_loc = rbs.index(sd)
+
+        # The accessibility fold only sees the last 27 nt of the RBS
+        if all(p < len(rbs) - 27 for p in mutated):
+            structure, accessibility_score, folding_energy = parent.structure, parent.accessibility_score, parent.folding_energy
+        else:
+            structure, accessibility_score, folding_energy = find_accessibility_score(rbs, self.CDS, sd, self.temperature)
+
+        # The AU score reads the 11 nt before the SD, the standby score the structure before it
+        au_window = range(len(rbs))[sd_loc-11:sd_loc]
+        if sd_loc == parent.sd_loc and not any(p in au_window for p in mutated):
+            au_score = parent.au_score
+        else:
+            au_score = find_au_score(rbs, sd)
+
+        if sd_loc == parent.sd_loc and structure is parent.structure:
+            standby_accessibility = parent.standby_accessibility
+        else:
+            standby_accessibility = find_standby_score(rbs, sd, structure)
+
+        return FeatureState(rbs, energies, binding_energy, sd, spacing, au_score, structure, accessibility_score, folding_energy, standby_accessibility)
+
+    def find_features(self, state):
+
+        return [state.binding_energy, state.spacing, state.au_score, state.accessibility_score, state.folding_energy, state.standby_accessibility, self.codon_score, self.gram_stain_numeric]
+
+    def find_tir_batch(self, RBS_list, parent=None):
+
+        if parent is None:
+            states = [self.find_state(rbs) for rbs in RBS_list]
+        else:
+            parent = self.find_parent_state(parent)
+            states = [self.find_mutant_state(parent, rbs) for rbs in RBS_list]
+
+        with metrics.stage("feature_matrix"):
+            features = [self.find_features(state) for state in states]
+        with metrics.stage("model_predict"):
+            return get_predictor().predict(features)
+
+
+@lru_cache(maxsize=16)
+def get_incremental_evaluator(gram_stain, temperature, rRNA, CDS):
+
+    return IncrementalEvaluator(gram_stain, temperature, rRNA, CDS)
+
+
+@metrics.timed("find_tir_batch_incremental")
+def find_tir_batch_incremental(gram_stain,temperature,rRNA,RBS_list,CDS,parent=None):
+
+    # Same arguments and results as find_tir_batch; candidates are evaluated as mutants of parent when one is given
+    rRNA = rRNA.upper().replace("T","U")[-8:]
+    CDS = CDS.upper().replace("T","U")
+    RBS_list = [RBS.upper().replace("T","U") for RBS in RBS_list]
+    if parent is not None:
+        parent = parent.upper().replace("T","U")
+
+    return get_incremental_evaluator(gram_stain,temperature,rRNA,CDS).find_tir_batch(RBS_list, parent)
@@ -0,0 +1,185 @@
+"""In-process timing metrics for the prediction and optimisation stages, rendered in the Prometheus text format.
+
+Stages record their call count, wall time and CPU time (of the calling thread), summaries record a count and sum
+of observed values per label set, e.g. the duration of each optimisation generation, and counters and gauges
+record a running total or latest value per label set. Recording is off unless
+switched on from the environment (SYNTHOPEDIA_METRICS=1) or from Django settings through configure(), and costs a
+single flag check per call when off. population_pool's worker processes hand what they record back with each
+result (take() in the worker, merge() in the parent), so work they do is reported here too.
+"""
+import functools
+import os
+import threading
+import time
+from contextlib import nullcontext
+
+enabled = os.environ.get("SYNTHOPEDIA_METRICS", "") not in ("", "0")
+
+prefix = "synthopedia"
+
+stages = {} # name -> [calls, wall seconds, CPU seconds]
+summaries = {} # name -> {labels: [count, sum]}
+counters = {} # name -> {labels: total}
+gauges = {} # name -> {labels: value}
+lock = threading.Lock()
+
+not_recording = nullcontext()
+
+
+def configure(enable):
+
+    global enabled
+    enabled = bool(enable)
+
+
+def reset():
+
+    with lock:
+        stages.clear()
+        summaries.clear()
+        counters.clear()
+        gauges.clear()
+
+
+def take():
+
+    # Everything recorded in this process so far, which is then cleared
+    with lock:
+        taken = (dict(stages), dict(summaries), dict(counters), dict(gauges))
+        stages.clear()
+        summaries.clear()
+        counters.clear()
+        gauges.clear()
+    return taken
+
+
+def merge(taken):
+
+    # Adds what another process recorded, as returned by its take(), to this process's records
+    if taken is None:
+        return
+    taken_stages, taken_summaries, taken_counters, taken_gauges = taken
+    with lock:
+        for name, taken_totals in taken_stages.items():
+            totals = stages.setdefault(name, [0, 0.0, 0.0])
+            for i, value in enumerate(taken_totals):
+                totals[i] += value
+        for name, by_labels in taken_summaries.items():
+            for key, (count, total) in by_labels.items():
+                totals = summaries.setdefault(name, {}).setdefault(key, [0, 0.0])
+                totals[0] += count
+                totals[1] += total
+        for name, by_labels in taken_counters.items():
+            merged = counters.setdefault(name, {})
+            for key, amount in by_labels.items():
+                merged[key] = merged.get(key, 0) + amount
+        for name, by_labels in taken_gauges.items():
+            gauges.setdefault(name, {}).update(by_labels)
+
+
+class Stage:
+
+    __slots__ = ("name", "wall", "cpu")
+
+    def __init__(self, name):
+        self.name = name
+
+    def __enter__(self):
+        self.wall = time.perf_counter()
+        self.cpu = time.thread_time()
+        return self
+
+    def __exit__(self, *exc_info):
+        wall = time.perf_counter() - self.wall
+        cpu = time.thread_time() - self.cpu
+        with lock:
+            totals = stages.setdefault(self.name, [0, 0.0, 0.0])
+            totals[0] += 1
+            totals[1] += wall
+            totals[2] += cpu
+
+
+def stage(name):
+
+    # with metrics.stage("fold"): ... times the block when recording is on
+    return Stage(name) if enabled else not_recording
+
+
+def timed(name):
+
+    # Decorator form of stage for a whole function
+    def decorate(function):
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            if not enabled:
+                return function(*args, **kwargs)
+            with Stage(name):
+                return function(*args, **kwargs)
+        return wrapper
+
+    return decorate
+
+
+def observe(name, value, **labels):
+
+    if not enabled:
+        return
+    key = tuple(sorted(labels.items()))
+    with lock:
+        totals = summaries.setdefault(name, {}).setdefault(key, [0, 0.0])
+        totals[0] += 1
+        totals[1] += value
+
+
+def increment(name, amount=1, **labels):
+
+    if not enabled:
+        return
+    key = tuple(sorted(labels.items()))
+    with lock:
+        by_labels = counters.setdefault(name, {})
+        by_labels[key] = by_labels.get(key, 0) + amount
+
+
+def set_gauge(name, value, **labels):
+
+    if not enabled:
+        return
+    with lock:
+        gauges.setdefault(name, {})[tuple(sorted(labels.items()))] = value
+
+
+def format_labels(labels):
+
+    escaped = [(key, str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")) for key, value in labels]
+    return "{" + ",".join(f'{key}="{value}"' for key, value in escaped) + "}" if labels else ""
+
+
+def render():
+
+    with lock:
+        stage_totals = {name: list(totals) for name, totals in sorted(stages.items())}
+        summary_totals = {name: {labels: list(totals) for labels, totals in sorted(by_labels.items())} for name, by_labels in sorted(summaries.items())}
+        values = {(name, kind): dict(sorted(by_labels.items())) for kind, registry in (("counter", counters), ("gauge", gauges)) for name, by_labels in sorted(registry.items())}
+
+    lines = []
+    for suffix, index, description in (("stage_calls_total", 0, "Calls of each prediction or optimisation stage"),
+                                       ("stage_seconds_total", 1, "Wall time spent in each stage"),
+                                       ("stage_cpu_seconds_total", 2, "CPU time of the calling thread spent in each stage")):
+        lines.append(f"# HELP {prefix}_{suffix} {description}")
+        lines.append(f"# TYPE {prefix}_{suffix} counter")
+        for name, totals in stage_totals.items():
+            lines.append(f"{prefix}_{suffix}{format_labels([('stage', name)])} {totals[index]}")
+
+    for name, by_labels in summary_totals.items():
+        lines.append(f"# TYPE {prefix}_{name} summary")
+        for labels, (count, total) in by_labels.items():
+            lines.append(f"{prefix}_{name}_count{format_labels(labels)} {count}")
+            lines.append(f"{prefix}_{name}_sum{format_labels(labels)} {total}")
+
+    for (name, kind), by_labels in values.items():
+        lines.append(f"# TYPE {prefix}_{name} {kind}")
+        for labels, value in by_labels.items():
+            lines.append(f"{prefix}_{name}{format_labels(labels)} {value}")
+
+    return "\n".join(lines) + "\n"
@@ -24,6 +24,9 @@ We will require a Conda environment in order to import the `ViennaRNA` library c
 
 """# Imports"""
 
+import os
+import sys
+
 import RNA
 import numpy as np
 import pandas as pd
@@ -31,6 +34,15 @@ import matplotlib.pyplot as plt
 import seaborn as sns
 from scipy import stats
 
+"""Features are computed by `feature_pipeline.py` in the repository root, which folds rows in parallel and caches them, so rerunning this notebook does not redo the folding. The functions below document how each feature is defined."""
+
+sys.path.append("..")
+from feature_pipeline import extract_binding_scan, extract_features
+from feature_store import find_dataset_fingerprint, save_features
+from model_selection import run_seed_benchmark, search_forest_params
+
+workers = os.cpu_count()
+
 """The `find_hybridization_energy` function takes in two RNA sequences and returns their hybridization energy."""
 
 def find_hybridization_energy(sequence1, sequence2, temp):
@@ -53,6 +65,7 @@ We load a dataset containing mRNA sequences and their experimentally found expre
 """
 
 df = pd.read_csv("Dataset - Reis and Salis - 1014.csv")
+fingerprint = find_dataset_fingerprint(df)
 
 len(df)
 
@@ -95,13 +108,12 @@ def bind_rRNA(rRNA,rbs,temp):
 
 bind_rRNA = np.vectorize(bind_rRNA)
 
+binding_scan = extract_binding_scan(df,range(4,10),workers=workers)
+
 for i in range(4,10):
 
-  df["rRNA sequence"] = df["rRNA"].apply(lambda x: x[-i:])
-  df["Binding energy"] = bind_rRNA(df["rRNA sequence"],df["RBS"],df["Temperature"])
-  corr = np.corrcoef(df["Mean expression"],df["Binding energy"])[0][1]
+  corr = np.corrcoef(df["Mean expression"],binding_scan[f"Binding energy ({i} nt)"])[0][1]
   print(f"{i} - {corr}")
-  df = df.drop(["rRNA sequence","Binding energy"],axis=1)
 
 """We get the highest correlation with expression level when we consider the binding of the last **8 nucleotides** of the 16S rRNA. This is consistent with the findings of [Yusupova et al. (2001)](https://doi.org/10.1016/S0092-8674(01)00435-4)"""
 
@@ -153,7 +165,9 @@ def find_spacing(rRNA,rbs,temp,gram):
 
 find_spacing = np.vectorize(find_spacing)
 
-df["Binding energy"], df["Shine-Dalgarno"], df["Spacing"] = find_spacing(df["rRNA"],df["RBS"],df["Temperature"],df["Gram stain"])
+features = extract_features(df,workers=workers)
+
+df["Binding energy"], df["Shine-Dalgarno"], df["Spacing"] = features["Binding energy"], features["Shine-Dalgarno"], features["Spacing"]
 
 """We can see that there is a good correlation between the binding energy and the expression level. Stronger binding leads to higher expression."""
 
@@ -224,7 +238,7 @@ def find_au_score(rbs,sd):
 
 find_au_score = np.vectorize(find_au_score)
 
-df["AU score"] = find_au_score(df["RBS"],df["Shine-Dalgarno"])
+df["AU score"] = features["AU score"]
 
 """We can see that mRNAs with higher A/U scores tend to have higher expression levels, on average."""
 
@@ -263,7 +277,7 @@ def find_accessibility_score(rbs,cds,sd,temp):
 
 find_accessibility_score = np.vectorize(find_accessibility_score)
 
-df["Structure"], df["Accessibility score"], df["Folding energy"] = find_accessibility_score(df["RBS"],df["CDS"],df["Shine-Dalgarno"],df["Temperature"])
+df["Structure"], df["Accessibility score"], df["Folding energy"] = features["Structure"], features["Accessibility score"], features["Folding energy"]
 
 """We can see that a higher accessibility score leads to higher expression levels, on average."""
 
@@ -323,7 +337,7 @@ def find_standby_score(rbs,sd,structure):
 
 find_standby_score = np.vectorize(find_standby_score)
 
-df["Standby accessibility"] = find_standby_score(df["RBS"],df["Shine-Dalgarno"],df["Structure"])
+df["Standby accessibility"] = features["Standby accessibility"]
 
 """We can see that more accessible standby sites have a higher expression level than less accessible standby sites.
 
@@ -401,12 +415,17 @@ y = df[["Mean expression",
         "UTR Designer prediction",
         "EMOPEC prediction"]]
 
-"""We train Random Forest Regressors with different hyperparameters using grid search cross validation. We then compare the performance of our "best" model with the RBS Calculator v2.1 for different train-test splits created by random seeds."""
+"""The features and labels are saved to the feature store (`feature_store/` in the repository root), so the grid search and seed benchmark below can be rerun on their own with `python model_selection.py reis-salis-1014`."""
+
+save_features("reis-salis-1014", X, y, fingerprint)
+
+"""We train Random Forest Regressors with different hyperparameters using grid search cross validation. We then compare the performance of our "best" model with the RBS Calculator v2.1 for different train-test splits created by random seeds.
+
+`search_forest_params` picks the same parameters as `GridSearchCV`, but grows each fold's forest once and scores the smaller `n_estimators` from its first trees."""
 
 from sklearn.model_selection import train_test_split
 
 from sklearn.ensemble import RandomForestRegressor
-from sklearn.model_selection import GridSearchCV
 
 X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=0.01, random_state=23)
 
@@ -418,39 +437,28 @@ param_grid = {
     'n_estimators': [50, 100, 200, 300, 1000]
 }
 
-rf = RandomForestRegressor(random_state=23)
-
-grid_search = GridSearchCV(estimator = rf, param_grid = param_grid, cv = 3, n_jobs = -1, verbose = 2)
+best_params, grid_results = search_forest_params(X_train, y_train["Mean expression"], param_grid, cv=3, random_state=23, workers=workers)
 
-grid_search.fit(X_train,y_train["Mean expression"])
-
-grid_search.best_estimator_
+best_params
 
 model = RandomForestRegressor(max_depth=80, max_features=3, min_samples_leaf=3, min_samples_split=8, n_estimators=50, random_state=23)
 
 seed_range = range(1000)
 
-model_perf = []
-rbs_calc_v1_0_perf = []
-rbs_calc_v1_1_perf = []
-rbs_calc_v2_0_perf = []
-rbs_calc_v2_1_perf = []
-rbs_designer_perf = []
-utr_designer_perf = []
-emopec_perf = []
-
-for seed in seed_range:
-  X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=0.01, random_state=seed)
-  model.fit(X_train,y_train["Mean expression"])
-  predictions = model.predict(X_test)
-  model_perf.append(np.corrcoef(y_test["Mean expression"],predictions)[0][1]**2)
-  rbs_calc_v1_0_perf.append(np.corrcoef(y_test["Mean expression"].apply(lambda x: 10**x),y_test["RBS Calculator v1.0 prediction"])[0][1]**2)
-  rbs_calc_v1_1_perf.append(np.corrcoef(y_test["Mean expression"].apply(lambda x: 10**x),y_test["RBS Calculator v1.1 prediction"])[0][1]**2)
-  rbs_calc_v2_0_perf.append(np.corrcoef(y_test["Mean expression"].apply(lambda x: 10**x),y_test["RBS Calculator v2.0 prediction"])[0][1]**2)
-  rbs_calc_v2_1_perf.append(np.corrcoef(y_test["Mean expression"].apply(lambda x: 10**x),y_test["RBS Calculator v2.1 prediction"])[0][1]**2)
-  rbs_designer_perf.append(np.corrcoef(y_test["Mean expression"].apply(lambda x: 10**x),y_test["RBS Designer prediction"])[0][1]**2)
-  utr_designer_perf.append(np.corrcoef(y_test["Mean expression"].apply(lambda x: 10**x),y_test["UTR Designer prediction"])[0][1]**2)
-  emopec_perf.append(np.corrcoef(y_test["Mean expression"].apply(lambda x: 10**x),y_test["EMOPEC prediction"])[0][1]**2)
+benchmark = run_seed_benchmark(model, X, y, seed_range, test_size=0.01, workers=workers)
+
+model_perf = list(benchmark["Model"])
+rbs_calc_v1_0_perf = list(benchmark["RBS Calculator v1.0"])
+rbs_calc_v1_1_perf = list(benchmark["RBS Calculator v1.1"])
+rbs_calc_v2_0_perf = list(benchmark["RBS Calculator v2.0"])
+rbs_calc_v2_1_perf = list(benchmark["RBS Calculator v2.1"])
+rbs_designer_perf = list(benchmark["RBS Designer"])
+utr_designer_perf = list(benchmark["UTR Designer"])
+emopec_perf = list(benchmark["EMOPEC"])
+
+# The seeds are fitted in worker processes; this is the model of the last seed, as the loop over seeds left it
+X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=0.01, random_state=seed_range[-1])
+model.fit(X_train,y_train["Mean expression"])
 
 """To prevent getting errors from correlations that are not a number, we convert the NaN correlations to 0."""
 
@@ -502,12 +510,9 @@ flowseq["CDS"] = flowseq["CDS"].apply(lambda x: x.upper().replace("T","U"))
 flowseq["rRNA"] = flowseq["rRNA"].apply(lambda x: x[-8:])
 flowseq["Mean expression"] = flowseq["Mean expression"].apply(lambda x: np.log10(x))
 
-flowseq["Binding energy"], flowseq["Shine-Dalgarno"], flowseq["Spacing"] = find_spacing(flowseq["rRNA"],flowseq["RBS"],flowseq["Temperature"],flowseq["Gram stain"])
-flowseq["AU score"] = find_au_score(flowseq["RBS"],flowseq["Shine-Dalgarno"])
-flowseq["Structure"], flowseq["Accessibility score"], flowseq["Folding energy"] = find_accessibility_score(flowseq["RBS"],flowseq["CDS"],flowseq["Shine-Dalgarno"],flowseq["Temperature"])
-flowseq["Standby accessibility"] = find_standby_score(flowseq["RBS"],flowseq["Shine-Dalgarno"],flowseq["Structure"])
-flowseq["Codon score"] = flowseq["CDS"].apply(find_codon_score)
-flowseq["Gram stain numeric"] = flowseq["Gram stain"].apply(lambda x: 0 if x=="Negative" else 1)
+flowseq_features = extract_features(flowseq,workers=workers)
+for column in flowseq_features.columns:
+  flowseq[column] = flowseq_features[column]
 
 X = flowseq[["Binding energy","Spacing","AU score","Accessibility score","Folding energy","Standby accessibility","Codon score","Gram stain numeric"]]
 y = flowseq["Mean expression"]
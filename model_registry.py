@@ -0,0 +1,84 @@
+import os
+import threading
+
+import joblib
+import pandas as pd
+
+import metrics
+from flat_forest import FlatForest
+
+default_model_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), "iGEM IITM 2023 - Final Model.joblib")
+
+# Overridable from the environment, or from Django settings through configure()
+model_path = os.environ.get("SYNTHOPEDIA_MODEL_PATH", default_model_path)
+mmap_mode = os.environ.get("SYNTHOPEDIA_MODEL_MMAP_MODE") or None
+
+# "flat" predicts with a FlatForest built from the model (or loaded from flat_forest_path), "sklearn" with the model itself
+prediction_backend = os.environ.get("SYNTHOPEDIA_PREDICTION_BACKEND", "flat")
+flat_forest_path = os.environ.get("SYNTHOPEDIA_FLAT_FOREST_PATH") or None
+
+model = None
+predictor = None
+model_lock = threading.Lock()
+
+
+class SklearnPredictor:
+
+    def __init__(self, model):
+        self.model = model
+
+    def predict(self, X):
+        # The model was fitted on named columns, so the whole matrix is labelled once per batch
+        with metrics.stage("dataframe"):
+            X = pd.DataFrame(X, columns=self.model.feature_names_in_, copy=False)
+        return self.model.predict(X)
+
+
+def configure(path=None, mmap=None, backend=None, flat_path=None):
+
+    global model_path, mmap_mode, prediction_backend, flat_forest_path, model, predictor
+
+    with model_lock:
+        if path is not None:
+            model_path = str(path)
+        if mmap is not None:
+            mmap_mode = mmap or None
+        if backend is not None:
+            prediction_backend = backend
+        if flat_path is not None:
+            flat_forest_path = str(flat_path) or None
+        model = None # Reloaded from the new settings on next use
+        predictor = None
+
+
+def get_model():
+
+    global model
+
+    # Loaded once per process, on first use, however many modules ask for it
+    if model is None:
+        with model_lock:
+            if model is None:
+                model = joblib.load(model_path, mmap_mode=mmap_mode)
+
+    return model
+
+
+def get_predictor():
+
+    global predictor
+
+    if predictor is None:
+        if prediction_backend == "sklearn":
+            loaded = SklearnPredictor(get_model())
+        elif prediction_backend != "flat":
+            raise ValueError(f"Unknown prediction backend: {prediction_backend}")
+        elif flat_forest_path is not None:
+            loaded = FlatForest.load(flat_forest_path, mmap_mode=mmap_mode)
+        else:
+            loaded = FlatForest.from_sklearn(get_model())
+        with model_lock:
+            if predictor is None:
+                predictor = loaded
+
+    return predictor
@@ -0,0 +1,139 @@
+"""Model selection for the training script: the random forest grid search and the random-seed benchmark against
+the published predictors, run from a feature store entry so neither recomputes features.
+
+The grid search scores exactly what GridSearchCV(RandomForestRegressor(random_state=...), param_grid, cv=3) scores,
+but fits each forest once per fold at the largest n_estimators in the grid. A forest's first n trees are the trees a
+forest of n would have grown, so every smaller n_estimators is scored from a prefix of the same trees. Seeds are
+run in parallel in chunks, and each worker keeps only the R² of every seed, not its model.
+
+    python model_selection.py reis-salis-1014 --seeds 1000 --workers 8 --dataset "model_files/Dataset - Reis and Salis - 1014.csv"
+"""
+import argparse
+import os
+
+import numpy as np
+import pandas as pd
+from joblib import Parallel, delayed
+from sklearn.base import clone
+from sklearn.ensemble import RandomForestRegressor
+from sklearn.metrics import r2_score
+from sklearn.model_selection import KFold, ParameterGrid, train_test_split
+
+from feature_store import find_dataset_fingerprint, load_features
+
+target = "Mean expression"
+
+comparators = {"RBS Calculator v1.0": "RBS Calculator v1.0 prediction",
+               "RBS Calculator v1.1": "RBS Calculator v1.1 prediction",
+               "RBS Calculator v2.0": "RBS Calculator v2.0 prediction",
+               "RBS Calculator v2.1": "RBS Calculator v2.1 prediction",
+               "RBS Designer": "RBS Designer prediction",
+               "UTR Designer": "UTR Designer prediction",
+               "EMOPEC": "EMOPEC prediction"}
+
+
+def find_prefix_scores(params, X_train, y_train, X_test, y_test, tree_counts, random_state):
+
+    # R² on the test fold of the forest's first n trees, for each n in tree_counts
+    forest = RandomForestRegressor(**params, n_estimators=max(tree_counts), random_state=random_state).fit(X_train, y_train)
+    X_test = X_test.astype(np.float32)
+
+    scores = {}
+    total = np.zeros(len(X_test))
+    for count, tree in enumerate(forest.estimators_, start=1):
+        total += tree.predict(X_test, check_input=False)
+        if count in tree_counts:
+            scores[count] = r2_score(y_test, total / count)
+
+    return scores
+
+
+def find_grid_scores(X, y, param_grid, cv=3, random_state=23, workers=None):
+
+    # One row per parameter combination, in GridSearchCV's order, with its per-fold, mean and rank test scores
+    X, y = np.asarray(X, dtype=np.float64), np.asarray(y, dtype=np.float64)
+    tree_counts = sorted(param_grid.get("n_estimators", [100]))
+    forest_grid = list(ParameterGrid({key: values for key, values in param_grid.items() if key != "n_estimators"}))
+    folds = list(KFold(n_splits=cv).split(X))
+
+    scores = Parallel(n_jobs=workers)(delayed(find_prefix_scores)(params, X[train], y[train], X[test], y[test], tree_counts, random_state)
+                                      for params in forest_grid for train, test in folds)
+
+    rows = []
+    for params in ParameterGrid(param_grid):
+        n_estimators = params.get("n_estimators", 100)
+        forest_params = {key: value for key, value in params.items() if key != "n_estimators"}
+        first = forest_grid.index(forest_params) * cv
+        rows.append({"params": params, **{f"split{i}_test_score": scores[first + i][n_estimators] for i in range(cv)}})
+
+    results = pd.DataFrame(rows)
+    split_scores = results[[f"split{i}_test_score" for i in range(cv)]]
+    results["mean_test_score"] = split_scores.mean(axis=1)
+    results["std_test_score"] = split_scores.std(axis=1, ddof=0)
+    results["rank_test_score"] = results["mean_test_score"].rank(method="min", ascending=False).astype(int)
+
+    return results
+
+
+def search_forest_params(X, y, param_grid, cv=3, random_state=23, workers=None):
+
+    # The best_params_ GridSearchCV would pick, and every combination's scores
+    results = find_grid_scores(X, y, param_grid, cv, random_state, workers)
+
+    return results["params"][results["rank_test_score"].argmin()], results
+
+
+def find_seed_scores(model, X, y, seeds, test_size):
+
+    scores = []
+    for seed in seeds:
+        X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=test_size, random_state=seed)
+        predictions = clone(model).fit(X_train, y_train[target]).predict(X_test)
+        expression = y_test[target].apply(lambda x: 10**x)
+        row = {"Seed": seed, "Model": np.corrcoef(y_test[target], predictions)[0][1]**2}
+        for name, column in comparators.items():
+            if column in y_test:
+                row[name] = np.corrcoef(expression, y_test[column])[0][1]**2
+        scores.append(row)
+
+    return scores
+
+
+def run_seed_benchmark(model, X, y, seeds=range(1000), test_size=0.01, workers=None, chunk_size=25):
+
+    # R² of the model and of every comparator present in y on each seed's test split, one row per seed.
+    # Comparator correlations that are not a number (constant test splits) are left as NaN.
+    seeds = list(seeds)
+    chunks = [seeds[i:i+chunk_size] for i in range(0, len(seeds), chunk_size)]
+
+    rows = []
+    for scores in Parallel(n_jobs=workers, return_as="generator")(delayed(find_seed_scores)(model, X, y, chunk, test_size) for chunk in chunks):
+        rows.extend(scores)
+
+    return pd.DataFrame(rows).set_index("Seed")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run the grid search and seed benchmark on a feature store entry")
+    parser.add_argument("name", help="Feature store entry, e.g. reis-salis-1014")
+    parser.add_argument("--seeds", type=int, default=1000)
+    parser.add_argument("--workers", type=int, default=os.cpu_count())
+    parser.add_argument("--dataset", default=os.path.join(os.path.dirname(os.path.abspath(__file__)), "model_files", "Dataset - Reis and Salis - 1014.csv"), help="CSV the entry must have been built from")
+    parser.add_argument("--store-dir", default=None)
+    parser.add_argument("--skip-grid-search", action="store_true")
+    args = parser.parse_args()
+
+    stored = load_features(args.name, find_dataset_fingerprint(pd.read_csv(args.dataset)), store_dir=args.store_dir)
+    if stored is None:
+        raise SystemExit(f"No feature store entry {args.name} for this feature version and {args.dataset}; run the training script first")
+    X, y = stored
+
+    if not args.skip_grid_search:
+        X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=0.01, random_state=23)
+        best_params, _ = search_forest_params(X_train, y_train[target], {"max_depth": [80, 90, 100, 110], "max_features": [2, 3], "min_samples_leaf": [3, 4, 5], "min_samples_split": [8, 10, 12], "n_estimators": [50, 100, 200, 300, 1000]}, workers=args.workers)
+        print(f"Best parameters - {best_params}")
+
+    model = RandomForestRegressor(max_depth=80, max_features=3, min_samples_leaf=3, min_samples_split=8, n_estimators=50, random_state=23)
+    benchmark = run_seed_benchmark(model, X, y, range(args.seeds), workers=args.workers)
+    for name in benchmark.columns:
+        print(f"{name} - {benchmark[name].fillna(0).mean()}")
@@ -0,0 +1,57 @@
+import os
+import random
+from concurrent.futures import ThreadPoolExecutor
+
+from exhaustive import find_free_positions, is_exhaustive_search_small
+from genetic_algorithm import find_deviation
+from optimise import optimize_rbs, parse_positions
+from score_cache import ScoreCache
+
+
+def find_hamming_distance(rbs1, rbs2):
+    # Positions that differ, counting any length difference as differing positions
+    return sum(base1 != base2 for base1, base2 in zip(rbs1, rbs2)) + abs(len(rbs1) - len(rbs2))
+
+
+def select_diverse_designs(scores, desired, designs, min_distance):
+    # Closest sequences to the target, skipping any within min_distance of one already picked
+    picked = []
+    for rbs, rate in sorted(scores.items(), key=lambda item: (find_deviation(item[1], desired), item[0])):
+        if all(find_hamming_distance(rbs, other) >= min_distance for other, _ in picked):
+            picked.append((rbs, rate))
+            if len(picked) == designs:
+                break
+    return picked
+
+
+def optimize_rbs_multistart(desired_initiation_rate, gram_stain, temperature, rRNA, RBS, CDS, positions_to_protect = [], starts=4, designs=3, min_distance=3, seed=None, cache=None, workers=None, callback=None, **options):
+    # Runs optimize_rbs from several independently seeded starts at once and returns up to `designs`
+    # (sequence, rate) pairs at least min_distance substitutions apart, best first, with each start's stop reason.
+    # The starts run on threads and share one score cache, so a candidate found by several starts is only scored
+    # once. ViennaRNA holds the GIL while folding, so the threads only score concurrently on the process pool:
+    # workers defaults to one per start, up to the number of CPUs. Evaluation and time limits apply per start.
+    if cache is None:
+        cache = ScoreCache()
+    rbs = RBS.upper().replace("T","U")
+    strategy = options.get("strategy", "auto")
+    if strategy == "exhaustive" or (strategy == "auto" and rbs and is_exhaustive_search_small(rbs, find_free_positions(rbs, parse_positions(positions_to_protect)))):
+        starts = 1 # An exhaustive search is the same from every start, and its designs come from everything it scored
+    if workers is None:
+        workers = min(starts, os.cpu_count() or 1)
+    seed_rng = random.Random(seed)
+    rngs = [random.Random(seed_rng.getrandbits(64)) for _ in range(starts)]
+
+    def run(start, rng):
+        progress = None
+        if callback is not None:
+            progress = lambda state: callback(dict(state, start=start, starts=starts))
+        return optimize_rbs(desired_initiation_rate, gram_stain, temperature, rRNA, RBS, CDS, positions_to_protect, cache=cache, workers=workers, callback=progress, rng=rng, **options)
+
+    with ThreadPoolExecutor(max_workers=starts, thread_name_prefix="optimise-start") as executor:
+        results = list(executor.map(run, range(starts), rngs))
+
+    # Every sequence any start scored is a candidate, not only each start's best
+    scores = cache.find_scores(gram_stain, temperature, rRNA, CDS)
+    for rbs, rate, _ in results:
+        scores[rbs] = rate
+    return select_diverse_designs(scores, desired_initiation_rate, designs, min_distance), [stop_reason for _, _, stop_reason in results]
@@ -0,0 +1,207 @@
+import json
+import zlib
+
+from django.conf import settings
+from django.core.exceptions import RequestDataTooBig
+from django.http import HttpResponseNotAllowed, JsonResponse
+from django.middleware.gzip import GZipMiddleware
+from django.urls import reverse
+
+from optimise import parse_positions
+from predict import feature_columns
+from . import bulk, jobs, offload
+
+# JSON counterparts of the predict, bulk predict and optimise pages, for scripts. Request bodies may be gzip
+# compressed (Content-Encoding: gzip), and responses are compressed for clients that accept it. Sequences are
+# scored in chunks by bulk.predict_rows on the offload pool, and every result carries its features as well as its TIR.
+
+feature_names = {column: column.lower().replace(" ", "_") for column in feature_columns}
+gram_stains = ("Positive", "Negative")
+sequence_fields = ("rbs_seq", "cds_seq", "temp", "gram", "rrna")
+optimise_fields = ("rbs_seq", "cds_seq", "target", "temp", "gram", "rrna")
+
+
+class BadRequest(Exception):
+
+    def __init__(self, message, status=400):
+        super().__init__(message)
+        self.status = status
+
+
+gzip_middleware = GZipMiddleware(lambda request: None)
+
+
+def api_view(*methods):
+    # Async, CSRF-exempt JSON view answering other methods with a 405, BadRequest with a JSON error and
+    # offload.Busy with a 429. Django 4.2's view decorators only wrap sync views, hence doing this here.
+    def decorate(view):
+        async def wrapper(request, *args, **kwargs):
+            if request.method not in methods:
+                return HttpResponseNotAllowed(methods)
+            try:
+                response = await view(request, *args, **kwargs)
+            except BadRequest as e:
+                response = JsonResponse({"error": str(e)}, status=e.status)
+            except offload.Busy as busy:
+                response = offload.set_retry_after(JsonResponse({"error": str(busy)}, status=429), busy)
+            return gzip_middleware.process_response(request, response)
+        wrapper.__name__ = view.__name__
+        wrapper.csrf_exempt = True
+        return wrapper
+    return decorate
+
+
+def read_body(request):
+    try:
+        body = request.body
+    except RequestDataTooBig:
+        raise BadRequest(f"Request body is larger than {settings.DATA_UPLOAD_MAX_MEMORY_SIZE} bytes", 413)
+    if request.headers.get("Content-Encoding", "").lower() == "gzip":
+        # Inflated no further than the size limit, so a small compressed body cannot expand without bound
+        try:
+            body = zlib.decompressobj(16 + zlib.MAX_WBITS).decompress(body, settings.API_MAX_BODY_SIZE + 1)
+        except zlib.error as e:
+            raise BadRequest(f"Invalid gzip body: {e}")
+    if len(body) > settings.API_MAX_BODY_SIZE:
+        raise BadRequest(f"Request body is larger than {settings.API_MAX_BODY_SIZE} bytes", 413)
+    try:
+        body = json.loads(body)
+    except (UnicodeDecodeError, json.JSONDecodeError) as e:
+        raise BadRequest(f"Invalid JSON: {e}")
+    if not isinstance(body, dict):
+        raise BadRequest("Expected a JSON object")
+    return body
+
+
+def check_record(record, fields):
+    if not isinstance(record, dict):
+        raise BadRequest("Each sequence must be a JSON object")
+    missing = [field for field in fields if record.get(field) is None]
+    if missing:
+        raise BadRequest(f"Missing fields: {', '.join(missing)}")
+    if record["gram"] not in gram_stains:
+        raise BadRequest(f"gram must be one of {', '.join(gram_stains)}")
+
+
+def check_count(records):
+    if len(records) > settings.API_MAX_SEQUENCES:
+        raise BadRequest(f"At most {settings.API_MAX_SEQUENCES} sequences per request", 413)
+
+
+def find_row(record):
+    return {"Gram stain": record["gram"], "Temperature": record["temp"], "rRNA": record["rrna"], "RBS": record["rbs_seq"], "CDS": record["cds_seq"], "Error": ""}
+
+
+def find_result(record, row):
+    # The record with the features and TIR of its scored row, or the error that kept it from being scored
+    result = {field: record[field] for field in sequence_fields}
+    if row["Error"]:
+        result["error"] = row["Error"]
+    else:
+        result.update({name: row[column] for column, name in feature_names.items()}, tir=float(row["Predicted TIR"]))
+    return result
+
+
+async def find_results(records):
+    rows = await offload.run(bulk.score_rows, [find_row(record) for record in records])
+    return [find_result(record, row) for record, row in zip(records, rows)]
+
+
+@api_view("POST")
+async def predict(request):
+    # One chassis and CDS (or one CDS per RBS) with any number of RBSs:
+    # {"gram": "Negative", "temp": 37, "rrna": "ACCTCCTTA", "cds_seq": "ATG...", "rbs_seq": ["AAGGAG...", ...]}
+    body = read_body(request)
+    rbs_list = body.get("rbs_seq") if isinstance(body.get("rbs_seq"), list) else [body.get("rbs_seq")]
+    cds_list = body.get("cds_seq") if isinstance(body.get("cds_seq"), list) else [body.get("cds_seq")] * len(rbs_list)
+    if len(cds_list) != len(rbs_list):
+        raise BadRequest("cds_seq must be one sequence or one per rbs_seq")
+    check_count(rbs_list)
+
+    records = [dict(body, rbs_seq=rbs, cds_seq=cds) for rbs, cds in zip(rbs_list, cds_list)]
+    for record in records:
+        check_record(record, sequence_fields)
+    return JsonResponse({"results": await find_results(records)})
+
+
+@api_view("POST")
+async def predict_batch(request):
+    # Sequences with their own chassis, any field missing from a sequence taken from the top level:
+    # {"gram": "Negative", "sequences": [{"rbs_seq": ..., "cds_seq": ..., "temp": 30, "rrna": ...}, ...]}
+    body = read_body(request)
+    sequences = body.pop("sequences", None)
+    if not isinstance(sequences, list):
+        raise BadRequest("sequences must be a list")
+    check_count(sequences)
+
+    records = [dict(body, **record) if isinstance(record, dict) else record for record in sequences]
+    for record in records:
+        check_record(record, sequence_fields)
+    return JsonResponse({"results": await find_results(records)})
+
+
+def find_number(record, field, kind, minimum=None, maximum=None):
+    # An optional field as an int or float within the given bounds, or None when it is left out
+    value = record.get(field)
+    if value is None:
+        return None
+    try:
+        if isinstance(value, bool) or (kind is int and float(value) != int(value)):
+            raise ValueError(value)
+        number = kind(value)
+    except (TypeError, ValueError, OverflowError):
+        raise BadRequest(f"{field} must be {'an integer' if kind is int else 'a number'}")
+    if not (minimum is None or number >= minimum) or not (maximum is None or number <= maximum):
+        raise BadRequest(f"{field} must be at least {minimum}" + (f" and at most {maximum}" if maximum is not None else ""))
+    return number
+
+
+def find_optimise_inputs(record):
+    check_record(record, optimise_fields)
+    inputs = {field: record[field] for field in optimise_fields}
+    protect = record.get("protect") or ""
+    if isinstance(protect, list):
+        protect = ",".join(str(position) for position in protect)
+    try:
+        if not isinstance(protect, str):
+            raise ValueError(protect)
+        parse_positions(protect)
+    except ValueError:
+        raise BadRequest("protect must be a list of positions or comma separated positions")
+    for field in ("target", "temp"):
+        find_number(record, field, float)
+    inputs.update(protect=protect, tolerance=find_number(record, "tolerance", float, 0), max_evaluations=find_number(record, "max_evaluations", int, 1),
+                  time_limit=find_number(record, "time_limit", float, 0), designs=find_number(record, "designs", int, 1, 10))
+    return inputs
+
+
+def find_job_result(request, job):
+    state = job.as_dict()
+    state.update(status_url=request.build_absolute_uri(reverse("api_optimise_job", args=[job.id])),
+                 events_url=request.build_absolute_uri(reverse("optimise_job_events", args=[job.id])))
+    if job.result is not None:
+        # Each design is returned with the features it was scored on, stored with the result when the job finished
+        rows = [dict(design.get("features", {}), **{"Predicted TIR": design["achieved_rate"], "Error": design.get("error", "")}) for design in job.result["designs"]]
+        state["result"] = dict(job.result, designs=[find_result(dict(job.inputs, rbs_seq=design["result_seq"]), row) for design, row in zip(job.result["designs"], rows)])
+    return state
+
+
+@api_view("POST")
+async def optimise(request):
+    # One optimisation, or several as {"requests": [...]}, each run as a job; finished jobs (including identical
+    # earlier requests) come back with their result, the rest with URLs to follow their progress
+    body = read_body(request)
+    records = body["requests"] if isinstance(body.get("requests"), list) else [body]
+    check_count(records)
+
+    submitted = [jobs.submit_optimise(inputs) for inputs in [find_optimise_inputs(record) for record in records]]
+    states = [find_job_result(request, job) for job in submitted]
+    return JsonResponse({"jobs": states}, status=200 if all(job.is_finished() for job in submitted) else 202)
+
+
+@api_view("GET")
+async def optimise_job(request, job_id):
+    job = jobs.get_job(job_id)
+    if job is None:
+        raise BadRequest("Unknown optimisation job", 404)
+    return JsonResponse(find_job_result(request, job))
@@ -0,0 +1,9 @@
+from django.urls import path
+from . import api
+
+urlpatterns = [
+    path("predict", api.predict, name="api_predict"),
+    path("predict/batch", api.predict_batch, name="api_predict_batch"),
+    path("optimise", api.optimise, name="api_optimise"),
+    path("optimise/<str:job_id>", api.optimise_job, name="api_optimise_job")
+]
@@ -4,3 +4,16 @@ from django.apps import AppConfig
 class MyappConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'myapp'
+
+    def ready(self):
+        import energy_table
+        import metrics
+        import model_registry
+        from django.conf import settings
+
+        metrics.configure(settings.SYNTHOPEDIA_METRICS)
+        energy_table.configure(settings.SYNTHOPEDIA_ENERGY_TABLE_LAZY_BUILD)
+        model_registry.configure(settings.SYNTHOPEDIA_MODEL_PATH, settings.SYNTHOPEDIA_MODEL_MMAP_MODE, settings.SYNTHOPEDIA_PREDICTION_BACKEND, settings.SYNTHOPEDIA_FLAT_FOREST_PATH)
+        if settings.SYNTHOPEDIA_PRELOAD_MODEL:
+            # With gunicorn --preload this runs before the workers fork, so they share the loaded forest
+            model_registry.get_predictor()
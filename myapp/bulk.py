@@ -0,0 +1,122 @@
+import csv
+from itertools import islice
+
+from predict import combine_features, feature_columns, find_sequence_features, predict_features
+
+# Same sequence and chassis columns as the Reis & Salis dataset in model_files/
+input_columns = ["Gram stain", "Temperature", "rRNA", "RBS", "CDS"]
+result_columns = feature_columns + ["Predicted TIR", "Error"]
+chunk_size = 1000
+
+
+def read_csv_rows(lines):
+    reader = csv.DictReader(lines)
+    missing = [column for column in input_columns if column not in (reader.fieldnames or [])]
+    if missing:
+        raise ValueError(f"CSV is missing the columns: {', '.join(missing)}")
+    return ({**row, "Error": ""} for row in reader) # Errors from an earlier run are not carried over
+
+
+def read_fasta_rows(lines, gram_stain, temperature, rRNA):
+    # Header: >name [key=value ...], where key is gram, temp, rrna or cds_start (0-based index of the start codon).
+    # The sequence is the RBS followed by the CDS, split at cds_start or at a "|" in the sequence.
+    header = None
+    sequence = []
+    for line in lines:
+        line = line.strip()
+        if line.startswith(">"):
+            if header is not None:
+                yield fasta_row(header, "".join(sequence), gram_stain, temperature, rRNA)
+            header = line[1:]
+            sequence = []
+        elif line and header is not None:
+            sequence.append(line)
+    if header is not None:
+        yield fasta_row(header, "".join(sequence), gram_stain, temperature, rRNA)
+
+
+def fasta_row(header, sequence, gram_stain, temperature, rRNA):
+    name, *fields = header.split()
+    fields = dict(field.split("=", 1) for field in fields if "=" in field)
+    row = {"Name": name, "Gram stain": fields.get("gram", gram_stain), "Temperature": fields.get("temp", temperature), "rRNA": fields.get("rrna", rRNA), "RBS": sequence, "CDS": "", "Error": ""}
+    if "|" in sequence:
+        row["RBS"], row["CDS"] = sequence.split("|", 1)
+    elif fields.get("cds_start", "").isdigit():
+        cds_start = int(fields["cds_start"])
+        row["RBS"], row["CDS"] = sequence[:cds_start], sequence[cds_start:]
+    else:
+        row["Error"] = "FASTA record needs a cds_start=N header field or a '|' between RBS and CDS"
+    return row
+
+
+def read_rows(lines, fasta=False, gram_stain="Negative", temperature=37, rRNA="ACCTCCTTA"):
+    if fasta:
+        return read_fasta_rows(lines, gram_stain, temperature, rRNA)
+    return read_csv_rows(lines)
+
+
+def iter_chunks(rows, size=chunk_size):
+    rows = iter(rows)
+    while True:
+        chunk = list(islice(rows, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def predict_rows(rows, size=chunk_size):
+    # Rows are scored a chunk at a time, so memory use does not grow with the size of the input
+    for chunk in iter_chunks(rows, size):
+        # Rows are folded one by one; their accessibility and standby scores are then computed for the chunk at once
+        scored = []
+        for row in chunk:
+            if row["Error"]:
+                scored.append(None)
+                continue
+            try:
+                rRNA = row["rRNA"].strip().upper().replace("T","U")[-8:]
+                RBS = row["RBS"].strip().upper().replace("T","U")
+                CDS = row["CDS"].strip().upper().replace("T","U")
+                scored.append(find_sequence_features(row["Gram stain"].strip(), float(row["Temperature"]), rRNA, RBS, CDS))
+            except (KeyError, ValueError, AttributeError, TypeError) as e:
+                scored.append(None)
+                row["Error"] = f"{type(e).__name__}: {e}"
+
+        combined = iter(combine_features(*zip(*[s for s in scored if s is not None])) if any(scored) else [])
+        features = [next(combined) if s is not None else None for s in scored]
+        rates = iter(predict_features([f for f in features if f is not None]))
+        for row, row_features in zip(chunk, features):
+            if row_features is not None:
+                row.update(zip(feature_columns, row_features))
+                row["Predicted TIR"] = next(rates)
+            yield row
+
+
+def score_rows(rows):
+    # predict_rows for a list of rows at once, as a top-level function a worker process can run
+    return list(predict_rows(rows))
+
+
+class LineBuffer:
+    # csv writers return each formatted line when writing to this, so results can be streamed
+    def write(self, value):
+        return value
+
+
+def iter_results_csv(rows, header=True):
+    # Without the header, the lines continue a CSV whose earlier rows were written by another call
+    rows = iter(rows)
+    first = next(rows, None)
+    if first is None:
+        return
+    fieldnames = [column for column in first if column not in result_columns] + result_columns
+    writer = csv.DictWriter(LineBuffer(), fieldnames=fieldnames, extrasaction="ignore")
+    if header:
+        yield writer.writeheader()
+    yield writer.writerow(first)
+    for row in rows:
+        yield writer.writerow(row)
+
+
+def is_fasta(name):
+    return name.lower().endswith((".fa", ".fasta", ".fna"))
@@ -1,3 +1,6 @@
+from django.conf import settings
+
+from multistart import optimize_rbs_multistart
 from optimise import *
 from predict import *
 # organism_choices = ["E.coli", "L.lactis"]
@@ -6,9 +9,20 @@ from predict import *
 # for i in organism_choices.keys:
 #     org_choices.append((i, i))
 
-def optimise(rbs_seq, target, temp, gram, cds_seq, rrna, protect):
-    optimized_rbs, optimized_rate = optimize_rbs(float(target), gram, float(temp), rrna, rbs_seq, cds_seq, protect)
-    return {"result_seq": str(optimized_rbs), "achieved_rate": str(optimized_rate)}
+def optimise(rbs_seq, target, temp, gram, cds_seq, rrna, protect, tolerance=None, max_evaluations=None, time_limit=None, designs=None, progress=None, cancel=None):
+    limits = {"tolerance": float(tolerance) if tolerance is not None else 1e-4,
+              "max_evaluations": int(max_evaluations) if max_evaluations is not None else None,
+              "time_limit": float(time_limit) if time_limit is not None else None}
+    designs = int(designs) if designs is not None else 1
+    if designs > 1:
+        # One independently seeded start per requested design, never fewer than OPTIMISE_STARTS
+        found, stop_reasons = optimize_rbs_multistart(float(target), gram, float(temp), rrna, rbs_seq, cds_seq, protect, starts=max(designs, settings.OPTIMISE_STARTS), designs=designs, min_distance=settings.OPTIMISE_MIN_DESIGN_DISTANCE, workers=settings.OPTIMISE_WORKERS, callback=progress, cancel=cancel, **limits)
+        (optimized_rbs, optimized_rate), stop_reason = found[0], ", ".join(sorted(set(stop_reasons)))
+    else:
+        optimized_rbs, optimized_rate, stop_reason = optimize_rbs(float(target), gram, float(temp), rrna, rbs_seq, cds_seq, protect, workers=settings.OPTIMISE_WORKERS, callback=progress, cancel=cancel, **limits)
+        found = [(optimized_rbs, optimized_rate)]
+    return {"result_seq": str(optimized_rbs), "achieved_rate": str(optimized_rate), "stop_reason": stop_reason,
+            "designs": [{"result_seq": str(rbs), "achieved_rate": str(rate)} for rbs, rate in found]}
     # return {"result_seq": "AAAAAA", "achieved_rate": "10"}
 
 def predict(rbs_seq,temp, gram, cds_seq, rrna):
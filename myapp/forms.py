@@ -8,6 +8,10 @@ class Optimise_input(forms.Form):
     gram = forms.ChoiceField(label="Gram stain of chassis", choices = [("1", "Positive"), ("2", "Negative")])
     rrna = forms.CharField(label = "16S rRNA sequence")
     protect = forms.CharField(label = "Sequence positions to exclude from modification", required=False, help_text="(comma separated integers - e.g. 0,1,2,17,18)")
+    tolerance = forms.DecimalField(label = "Acceptable deviation from the target", required=False, min_value=0, help_text="(stops as soon as a sequence is this close - default 0.0001)")
+    max_evaluations = forms.IntegerField(label = "Maximum number of sequences to evaluate", required=False, min_value=1)
+    time_limit = forms.DecimalField(label = "Time limit (seconds)", required=False, min_value=0)
+    designs = forms.IntegerField(label = "Number of distinct designs", required=False, min_value=1, max_value=10, help_text="(more than one runs several independent optimisations and returns the best dissimilar sequences)")
 
 class Predict_input(forms.Form):
     rbs_seq = forms.CharField(label="RBS sequence")
@@ -15,3 +19,9 @@ class Predict_input(forms.Form):
     temp = forms.DecimalField(label="Temperature (°C)")
     gram = forms.ChoiceField(label="Gram stain of chassis", choices = [("1", "Positive"), ("2", "Negative")])
     rrna = forms.CharField(label = "16S rRNA sequence")
+
+class Bulk_predict_input(forms.Form):
+    sequences = forms.FileField(label="CSV or FASTA file", help_text="(CSV with Gram stain, Temperature, rRNA, RBS and CDS columns, or FASTA with a cds_start=N header field)")
+    gram = forms.ChoiceField(label="Gram stain of chassis for FASTA records", choices = [("Positive", "Positive"), ("Negative", "Negative")], initial="Negative")
+    temp = forms.DecimalField(label="Temperature (°C) for FASTA records", initial=37)
+    rrna = forms.CharField(label = "16S rRNA sequence for FASTA records", initial="ACCTCCTTA")
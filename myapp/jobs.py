@@ -0,0 +1,180 @@
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+
+import stopping
+from predict import feature_columns
+
+from . import bulk, engine, offload, result_cache
+
+jobs = OrderedDict()
+jobs_lock = threading.Lock()
+executor = None
+
+
+class Job:
+
+    def __init__(self, job_id, inputs):
+        self.id = job_id
+        self.inputs = inputs
+        self.status = "queued"
+        self.progress = {}
+        self.result = None
+        self.error = None
+        self.version = 0
+        self.changed = threading.Condition()
+        self.cancel_token = stopping.CancellationToken()
+        self.listeners = 0
+
+    def update(self, **state):
+        # Every change bumps the version and wakes anything waiting in iter_events
+        with self.changed:
+            for name, value in state.items():
+                setattr(self, name, value)
+            self.version += 1
+            self.changed.notify_all()
+
+    def update_progress(self, progress):
+        self.update(progress=progress)
+
+    def is_finished(self):
+        return self.status in ("done", "failed", "cancelled")
+
+    def cancel(self):
+        # A running job stops within a generation and keeps its best sequence so far as the result
+        self.cancel_token.cancel()
+        with self.changed:
+            if self.status == "queued":
+                self.update(status="cancelled")
+
+    def add_listener(self):
+        with self.changed:
+            self.listeners += 1
+
+    def remove_listener(self):
+        # Once nobody has watched the job for OPTIMISE_CANCEL_UNWATCHED_AFTER seconds, it is cancelled
+        with self.changed:
+            self.listeners -= 1
+            if self.listeners > 0 or self.is_finished() or settings.OPTIMISE_CANCEL_UNWATCHED_AFTER is None:
+                return
+        timer = threading.Timer(settings.OPTIMISE_CANCEL_UNWATCHED_AFTER, self.cancel_if_unwatched)
+        timer.daemon = True
+        timer.start()
+
+    def cancel_if_unwatched(self):
+        with self.changed:
+            if self.listeners == 0 and not self.is_finished():
+                self.cancel()
+
+    def wait_for_change(self, version, timeout):
+        # The job's version and state once it differs from version, or version and None after timeout seconds
+        with self.changed:
+            if not self.changed.wait_for(lambda: self.version != version, timeout):
+                return version, None
+            return self.version, self.as_dict()
+
+    def iter_events(self, keep_alive=15):
+        # Yields the job's state each time it changes, ending once it has finished, or None after
+        # keep_alive seconds without a change so a streaming response can keep its connection open
+        version = -1
+        while True:
+            version, state = self.wait_for_change(version, keep_alive)
+            yield state
+            if state is not None and state["status"] in ("done", "failed", "cancelled"):
+                return
+
+    async def aiter_events(self, keep_alive=15):
+        # iter_events for ASGI responses: the waiting happens on a worker thread, not the event loop
+        version = -1
+        while True:
+            version, state = await sync_to_async(self.wait_for_change, thread_sensitive=False)(version, keep_alive)
+            yield state
+            if state is not None and state["status"] in ("done", "failed", "cancelled"):
+                return
+
+    def as_dict(self):
+        return {"id": self.id, "status": self.status, "progress": self.progress, "result": self.result, "error": self.error}
+
+
+def get_executor():
+    global executor
+    with jobs_lock:
+        if executor is None:
+            executor = ThreadPoolExecutor(max_workers=settings.OPTIMISE_JOB_THREADS, thread_name_prefix="optimise-job")
+    return executor
+
+
+def find_job_id(inputs):
+    # Inputs sharing a cached result map to the same job, so a resubmission joins the running job or returns its stored result
+    return result_cache.find_optimise_key(inputs).split(":", 1)[1][:32]
+
+
+def submit_optimise(inputs):
+    # Raises offload.Busy instead of queueing more than OPTIMISE_MAX_QUEUED_JOBS behind the running jobs
+    job_id = find_job_id(inputs)
+    with jobs_lock:
+        job = jobs.get(job_id)
+        if job is not None and job.status not in ("failed", "cancelled"):
+            jobs.move_to_end(job_id)
+            return job
+
+    # The same optimisation may have finished earlier in another process or in a job since discarded
+    result = result_cache.get_optimise_result(inputs)
+
+    with jobs_lock:
+        job = jobs.get(job_id)
+        if job is not None and job.status not in ("failed", "cancelled"):
+            return job # Submitted by another request meanwhile
+        active = sum(1 for job in jobs.values() if job.status in ("queued", "running"))
+        if result is None and active >= settings.OPTIMISE_JOB_THREADS + settings.OPTIMISE_MAX_QUEUED_JOBS:
+            raise offload.Busy(settings.OPTIMISE_RETRY_AFTER)
+        job = Job(job_id, inputs)
+        jobs[job_id] = job
+        discard_finished_jobs()
+
+    if result is not None:
+        job.update(result=result, status="done")
+        return job
+    get_executor().submit(run_job, job)
+    return job
+
+
+def discard_finished_jobs():
+    finished = [job_id for job_id, job in jobs.items() if job.is_finished()]
+    for job_id in finished[:max(0, len(jobs) - settings.OPTIMISE_JOBS_KEPT)]:
+        del jobs[job_id]
+
+
+def run_job(job):
+    with job.changed:
+        if job.is_finished():
+            return # Cancelled while queued
+        job.update(status="running")
+    try:
+        result = engine.optimise(**job.inputs, progress=job.update_progress, cancel=job.cancel_token)
+        add_design_features(job.inputs, result)
+        if stopping.cancelled not in result["stop_reason"]:
+            result_cache.set_optimise_result(job.inputs, result)
+        job.update(result=result, status="cancelled" if stopping.cancelled in result["stop_reason"] else "done")
+    except stopping.Cancelled:
+        job.update(status="cancelled")
+    except Exception as e:
+        job.update(error=str(e), status="failed")
+
+
+def add_design_features(inputs, result):
+    # Features of each design, found once when the job finishes rather than whenever its result is requested
+    rows = bulk.score_rows([{"Gram stain": inputs["gram"], "Temperature": inputs["temp"], "rRNA": inputs["rrna"], "RBS": design["result_seq"], "CDS": inputs["cds_seq"], "Error": ""} for design in result["designs"]])
+    for design, row in zip(result["designs"], rows):
+        if row["Error"]:
+            design["error"] = row["Error"]
+        else:
+            design["features"] = {column: row[column] for column in feature_columns}
+
+
+def get_job(job_id):
+    with jobs_lock:
+        return jobs.get(job_id)
@@ -0,0 +1,31 @@
+from django.core.management.base import BaseCommand
+
+import energy_table
+from hybridisation import model_details
+
+# 3' tails of the 16S rRNA of the chassis we use most, as passed to find_tir after truncation
+default_rRNAs = ["CCUCCUUA", "CCUCCUUU"] # E. coli, B. subtilis
+default_temps = [30, 37]
+
+
+class Command(BaseCommand):
+    help = "Precompute the 8-mer duplex energy tables used by find_spacing"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--rrna", action="append", help="rRNA sequence (only its last 8 nucleotides are used). Repeatable.")
+        parser.add_argument("--temp", action="append", type=float, help="Temperature in °C. Repeatable.")
+        parser.add_argument("--force", action="store_true", help="Rebuild tables that already exist")
+
+    def handle(self, *args, **options):
+        rRNAs = [rRNA.upper().replace("T","U")[-8:] for rRNA in options["rrna"] or default_rRNAs]
+        temps = options["temp"] or default_temps
+
+        for rRNA in rRNAs:
+            for temp in temps:
+                path = energy_table.find_table_path(rRNA, temp)
+                if options["force"]:
+                    path = energy_table.build_energy_table(rRNA, temp, model_details(temp))
+                elif energy_table.load_energy_table(rRNA, temp, model_details(temp), build=True) is None:
+                    self.stderr.write(f"Skipping {rRNA}: tables need an 8 nt A/C/G/U rRNA tail")
+                    continue
+                self.stdout.write(f"{rRNA} at {temp:g} °C: {path}")
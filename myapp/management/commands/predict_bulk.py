@@ -0,0 +1,32 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from myapp import bulk
+
+
+class Command(BaseCommand):
+    help = "Predict the TIR of every RBS-CDS pair in a CSV or FASTA file and write the features and predictions to a CSV"
+
+    def add_arguments(self, parser):
+        parser.add_argument("input", help="CSV with Gram stain, Temperature, rRNA, RBS and CDS columns, or FASTA")
+        parser.add_argument("output", help="Results CSV")
+        parser.add_argument("--format", choices=["csv", "fasta"], help="Input format (guessed from the file extension by default)")
+        parser.add_argument("--gram", default="Negative", choices=["Positive", "Negative"], help="Gram stain for FASTA records without a gram= field")
+        parser.add_argument("--temp", default=37, type=float, help="Temperature for FASTA records without a temp= field")
+        parser.add_argument("--rrna", default="ACCTCCTTA", help="16S rRNA for FASTA records without an rrna= field")
+        parser.add_argument("--chunk-size", default=bulk.chunk_size, type=int, help="Rows scored per batch")
+
+    def handle(self, *args, **options):
+        fasta = options["format"] == "fasta" if options["format"] else bulk.is_fasta(options["input"])
+
+        with open(options["input"], newline="", encoding="utf-8-sig") as f, open(options["output"], "w", newline="") as out:
+            try:
+                rows = bulk.read_rows(f, fasta, options["gram"], options["temp"], options["rrna"])
+            except ValueError as e:
+                raise CommandError(str(e))
+
+            count = 0
+            for line in bulk.iter_results_csv(bulk.predict_rows(rows, options["chunk_size"])):
+                out.write(line)
+                count += 1
+
+        self.stdout.write(f"Wrote {max(count - 1, 0)} predictions to {options['output']}")
@@ -0,0 +1,58 @@
+import asyncio
+import threading
+
+from django.conf import settings
+
+from population_pool import get_pool, run_recorded, unpack_recorded
+
+# CPU-bound work from async views runs on the population pool's worker processes, so the event loop (and the
+# thread Django runs sync views on under ASGI) stays free for light pages. At most OFFLOAD_WORKERS tasks run and
+# OFFLOAD_MAX_QUEUED wait; past that, callers get Busy and answer 429 with a Retry-After header.
+
+slots = None
+slots_lock = threading.Lock()
+
+
+class Busy(Exception):
+
+    def __init__(self, retry_after=None):
+        super().__init__("The server is busy, try again shortly")
+        self.retry_after = retry_after if retry_after is not None else settings.OFFLOAD_RETRY_AFTER
+
+
+def get_slots():
+    global slots
+    with slots_lock:
+        if slots is None:
+            slots = threading.BoundedSemaphore(settings.OFFLOAD_WORKERS + settings.OFFLOAD_MAX_QUEUED)
+    return slots
+
+
+async def run(function, *args):
+    # function and its arguments are pickled to a worker process, so function must be importable at module level.
+    # Stage timings the worker records come back with the result and are added to this process's metrics.
+    if not get_slots().acquire(blocking=False):
+        raise Busy()
+    try:
+        future = get_pool(settings.OFFLOAD_WORKERS).submit(run_recorded, function, *args)
+    except BaseException:
+        slots.release()
+        raise
+    # The slot is held until the worker finishes, even if the client goes away first
+    future.add_done_callback(lambda future: slots.release())
+    return unpack_recorded(await asyncio.wrap_future(future))
+
+
+async def run_when_free(function, *args, poll=0.1):
+    # run for work that can no longer be refused, such as the rest of a response already being streamed:
+    # waits for a free slot instead of raising Busy
+    while True:
+        try:
+            return await run(function, *args)
+        except Busy:
+            await asyncio.sleep(poll)
+
+
+def set_retry_after(response, busy):
+    response["Retry-After"] = str(busy.retry_after)
+    return response
@@ -0,0 +1,83 @@
+import hashlib
+import json
+import threading
+
+from django.conf import settings
+from django.core.cache import caches
+
+import metrics
+from optimise import parse_positions
+from predict import find_cds_prefix
+
+from . import engine, offload
+
+# Results of engine.predict and engine.optimise shared across requests through Django's cache framework (the
+# RESULT_CACHE_ALIAS cache, with its own timeout and size limit). Keys are built from the inputs as find_tir sees
+# them, so requests differing only in case, T/U, rRNA beyond its last 8 nt or CDS past the folded prefix share a result.
+
+lookups = {} # kind -> [hits, misses], for this process
+lookups_lock = threading.Lock()
+
+
+def normalise(sequence):
+    return str(sequence).strip().upper().replace("T","U")
+
+
+def find_key(kind, inputs):
+    return f"{kind}:" + hashlib.sha256(json.dumps(inputs, sort_keys=True).encode()).hexdigest()
+
+
+def find_predict_key(rbs_seq, temp, gram, cds_seq, rrna):
+    rbs = normalise(rbs_seq)
+    return find_key("predict", {"rbs": rbs, "temp": float(temp), "gram": str(gram).strip(), "rrna": normalise(rrna)[-8:], "cds": find_cds_prefix(rbs, normalise(cds_seq))})
+
+
+def find_optimise_key(inputs):
+    # Designs keep the length of the input RBS (27 nt when it is left empty), so its CDS prefix covers them all
+    inputs = {name: str(value).strip() if value is not None else None for name, value in inputs.items()}
+    rbs = normalise(inputs.pop("rbs_seq"))
+    inputs.update(rbs=rbs, temp=float(inputs.pop("temp")), target=float(inputs.pop("target")), rrna=normalise(inputs.pop("rrna"))[-8:],
+                  cds=find_cds_prefix(rbs or "N"*27, normalise(inputs.pop("cds_seq"))), protect=sorted(set(parse_positions(inputs.pop("protect") or ""))))
+    for name, kind in (("tolerance", float), ("time_limit", float), ("max_evaluations", int), ("designs", int)):
+        if inputs.get(name) is not None:
+            inputs[name] = kind(float(inputs[name]))
+    return find_key("optimise", inputs)
+
+
+def record_lookup(kind, hit):
+    with lookups_lock:
+        counts = lookups.setdefault(kind, [0, 0])
+        counts[0 if hit else 1] += 1
+        ratio = counts[0] / sum(counts)
+    metrics.increment("result_cache_lookups_total", kind=kind, result="hit" if hit else "miss")
+    metrics.set_gauge("result_cache_hit_ratio", ratio, kind=kind)
+
+
+def find_hit_ratio(kind):
+    with lookups_lock:
+        hits, misses = lookups.get(kind, (0, 0))
+    return hits / (hits + misses) if hits + misses else None
+
+
+def get_result(kind, key):
+    result = caches[settings.RESULT_CACHE_ALIAS].get(key)
+    record_lookup(kind, result is not None)
+    return result
+
+
+async def predict(rbs_seq, temp, gram, cds_seq, rrna):
+    # Misses are computed on the offload pool (see offload.py), which may raise offload.Busy
+    key = find_predict_key(rbs_seq, temp, gram, cds_seq, rrna)
+    result = get_result("predict", key)
+    if result is None:
+        result = await offload.run(engine.predict, rbs_seq, temp, gram, cds_seq, rrna)
+        caches[settings.RESULT_CACHE_ALIAS].set(key, result)
+    return result
+
+
+def get_optimise_result(inputs):
+    return get_result("optimise", find_optimise_key(inputs))
+
+
+def set_optimise_result(inputs, result):
+    caches[settings.RESULT_CACHE_ALIAS].set(find_optimise_key(inputs), result)
@@ -1,3 +1,207 @@
+import json
+import random
+import threading
+from decimal import Decimal
+from unittest import mock
+
+import RNA
+import numpy as np
+import pandas as pd
+from django.conf import settings
 from django.test import TestCase
+from django.urls import reverse
+
+import energy_table
+import stopping
+from exhaustive import ExhaustiveSearch
+from flat_forest import FlatForest
+from hybridisation import find_spacing_penalty, get_hybridisation_engine, model_details
+from incremental import find_tir_batch_incremental
+from model_registry import get_model
+from optimise import optimize_rbs
+from predict import find_accessibility_score, find_features, find_spacing, find_standby_score, find_tir, find_tir_batch
+from structure_scores import encode_structures, find_accessibility_scores, find_standby_scores
+
+from . import bulk, jobs, offload
+
+# The faster paths added for prediction and optimisation must give exactly what the original functions give
+
+dataset_path = settings.BASE_DIR / "model_files" / "Dataset - Reis and Salis - 1014.csv"
+
+
+def load_rows(count=20, seed=2023):
+    df = pd.read_csv(dataset_path).sample(count, random_state=seed)
+    return [{"gram": row["Gram stain"], "temp": float(row["Temperature"]), "rRNA": row["rRNA"].upper().replace("T","U")[-8:],
+             "RBS": row["RBS"].upper().replace("T","U"), "CDS": row["CDS"].upper().replace("T","U")} for _, row in df.iterrows()]
+
+
+def scan_windows(rRNA, rbs, temp, gram):
+    # find_spacing as it was before the hybridisation engine: one duplex fold per window
+    md = model_details(temp)
+    min_energy, sd, best_spacing = 0, "", 0
+    for i in range(len(rbs)-len(rRNA)+1):
+        energy = RNA.fold_compound(f"{rRNA}&{rbs[i:i+len(rRNA)]}", md).mfe_dimer()[1] * find_spacing_penalty(len(rbs[i+len(rRNA):]), gram)
+        if energy <= min_energy:
+            min_energy, sd, best_spacing = energy, rbs[i:i+len(rRNA)], len(rbs[i+len(rRNA):])
+    return RNA.fold_compound(f"{rRNA}&{sd}", md).mfe_dimer()[1], sd, best_spacing
+
+
+def mutate(rbs, rng, changes):
+    rbs = list(rbs)
+    for position in rng.sample(range(len(rbs)), changes):
+        rbs[position] = rng.choice("ACGU")
+    return "".join(rbs)
+
+
+class FindTirTests(TestCase):
+
+    def test_batch_matches_the_model_on_each_row(self):
+        rows = load_rows()
+        chassis = rows[0]
+        # RBSs of several lengths, one as DNA and one twice, against an rRNA given as DNA
+        RBS_list = [row["RBS"] for row in rows] + [rows[1]["RBS"].replace("U","T"), rows[2]["RBS"]]
+        self.assertGreater(len({len(RBS) for RBS in RBS_list}), 1)
+
+        model = get_model()
+        features = [find_features(chassis["gram"], chassis["temp"], chassis["rRNA"], RBS.replace("T","U"), chassis["CDS"]) for RBS in RBS_list]
+        expected = model.predict(pd.DataFrame(features, columns=model.feature_names_in_))
+
+        rates = find_tir_batch(chassis["gram"], chassis["temp"], "A" + chassis["rRNA"].replace("U","T"), RBS_list, chassis["CDS"])
+        self.assertTrue(np.array_equal(rates, expected))
+        self.assertEqual([find_tir(chassis["gram"], chassis["temp"], chassis["rRNA"], RBS, chassis["CDS"]) for RBS in RBS_list], list(expected))
+
+
+class HybridisationTests(TestCase):
+
+    def test_find_spacing_matches_the_window_scan(self):
+        cases = [(row["rRNA"], row["RBS"], row["temp"], row["gram"]) for row in load_rows()]
+        # A 9 nt tail has no energy table, and a window with an N is folded on its own
+        cases += [("ACCUCCUUA", row["RBS"], row["temp"], row["gram"]) for row in load_rows(5)]
+        cases += [(row["rRNA"], row["RBS"][:-12] + "N" + row["RBS"][-11:], row["temp"], row["gram"]) for row in load_rows(5)]
+        for rRNA, rbs, temp, gram in cases:
+            self.assertEqual(get_hybridisation_engine(rRNA, temp).find_spacing(rbs, gram), scan_windows(rRNA, rbs, temp, gram), (rRNA, rbs))
+
+    def test_energy_table_entries_match_mfe_dimer(self):
+        rng = random.Random(5)
+        for rRNA, temp in [("CCUCCUUA", 37.0), ("CCUCCUUU", 30.0)]:
+            table = energy_table.load_energy_table(rRNA, temp, model_details(temp), build=True)
+            for window in ["".join(rng.choice("ACGU") for _ in range(energy_table.window_length)) for _ in range(200)] + ["AAAAAAAA", "UUUUUUUU", "AAGGAGGU"]:
+                self.assertEqual(float(table[energy_table.find_window_indices(window)[0]]), RNA.fold_compound(f"{rRNA}&{window}", model_details(temp)).mfe_dimer()[1], window)
+
+
+class FlatForestTests(TestCase):
+
+    def test_predicts_exactly_as_the_model(self):
+        model = get_model()
+        X = np.array([find_features(row["gram"], row["temp"], row["rRNA"], row["RBS"], row["CDS"]) for row in load_rows()])
+        # Random rows over a wider range reach branches the dataset rows don't
+        rng = np.random.default_rng(23)
+        X = np.vstack([X, rng.uniform(X.min(axis=0) - 1, X.max(axis=0) + 1, size=(500, X.shape[1]))])
+
+        expected = model.predict(pd.DataFrame(X, columns=model.feature_names_in_))
+        self.assertTrue(np.array_equal(FlatForest.from_sklearn(model).predict(X), expected))
+
+
+class IncrementalTests(TestCase):
+
+    def test_mutants_score_as_a_full_evaluation(self):
+        rng = random.Random(11)
+        for row in load_rows(5):
+            mutants = [mutate(row["RBS"], rng, rng.randint(1, 4)) for _ in range(30)]
+            expected = find_tir_batch(row["gram"], row["temp"], row["rRNA"], mutants, row["CDS"])
+            self.assertTrue(np.array_equal(find_tir_batch_incremental(row["gram"], row["temp"], row["rRNA"], mutants, row["CDS"], parent=row["RBS"]), expected))
+            self.assertTrue(np.array_equal(find_tir_batch_incremental(row["gram"], row["temp"], row["rRNA"], mutants, row["CDS"]), expected))
+
+
+class ExhaustiveSearchTests(TestCase):
+
+    def test_finds_the_brute_force_best(self):
+        row = load_rows(1)[0]
+        rbs = row["RBS"]
+        free_positions = [2, len(rbs) - 12, len(rbs) - 3]
+        search = ExhaustiveSearch(row["gram"], row["temp"], row["rRNA"], rbs, row["CDS"], free_positions)
+        candidates = [search.find_candidate(i) for i in range(len(search.codes))]
+        expected = dict(zip(candidates, find_tir_batch(row["gram"], row["temp"], row["rRNA"], candidates, row["CDS"])))
+
+        target = float(np.median(list(expected.values())))
+        scored, rates, best, best_rate, stop_reason = search.search(target, stopping.StoppingCriteria(target, tolerance=0))
+
+        self.assertEqual(len(candidates), 4 ** len(free_positions))
+        self.assertEqual(stop_reason, stopping.search_completed)
+        self.assertEqual({rbs: expected[rbs] for rbs in scored}, dict(zip(scored, rates)))
+        self.assertEqual(abs(best_rate - target), min(abs(rate - target) for rate in expected.values()))
+        self.assertEqual(best_rate, expected[best])
+
+    def test_stops_before_scoring_without_a_budget(self):
+        row = load_rows(1)[0]
+        search = ExhaustiveSearch(row["gram"], row["temp"], row["rRNA"], row["RBS"], row["CDS"], [2, 5])
+        scored, rates, best, best_rate, stop_reason = search.search(1.0, stopping.StoppingCriteria(1.0, max_evaluations=0))
+
+        self.assertEqual(stop_reason, stopping.max_evaluations_reached)
+        self.assertEqual(best, row["RBS"])
+        self.assertEqual(best_rate, find_tir_batch(row["gram"], row["temp"], row["rRNA"], [row["RBS"]], row["CDS"])[0])
+
+
+class StoppingTests(TestCase):
+
+    def test_each_criterion_gives_its_stop_reason(self):
+        row = load_rows(1)[0]
+        cancel = stopping.CancellationToken()
+        cancel.cancel()
+        runs = [({"tolerance": 1e6}, stopping.target_reached), ({"tolerance": 0, "max_evaluations": 30}, stopping.max_evaluations_reached),
+                ({"tolerance": 0, "time_limit": 0}, stopping.deadline_reached), ({"cancel": cancel}, stopping.cancelled)]
+        for strategy in ["ga", "hill_climb"]:
+            for kwargs, expected in runs:
+                events = []
+                best, rate, stop_reason = optimize_rbs(2.0, row["gram"], row["temp"], row["rRNA"], row["RBS"], row["CDS"], generations=1000, population_size=8,
+                                                       strategy=strategy, rng=random.Random(13), callback=events.append, **kwargs)
+                self.assertEqual(stop_reason, expected, (strategy, kwargs))
+                self.assertTrue(events, (strategy, kwargs))
+                if "max_evaluations" in kwargs:
+                    self.assertTrue(all(event["evaluations"] <= kwargs["max_evaluations"] for event in events), (strategy, events))
+                    self.assertEqual(events[-1]["evaluations"], kwargs["max_evaluations"])
+
+
+class StructureScoreTests(TestCase):
+
+    def test_batch_scores_match_the_single_structure_scores(self):
+        structures, sd_locs, accessibility, standby = [], [], [], []
+        for row in load_rows():
+            sd = find_spacing(row["rRNA"], row["RBS"], row["temp"], row["gram"])[1]
+            structure, accessibility_score, _ = find_accessibility_score(row["RBS"], row["CDS"], sd, row["temp"])
+            structures.append(structure)
+            sd_locs.append(row["RBS"].index(sd))
+            accessibility.append(accessibility_score)
+            standby.append(find_standby_score(row["RBS"], sd, structure))
+
+        matrix, lengths = encode_structures(structures)
+        self.assertEqual(find_accessibility_scores(matrix).tolist(), accessibility)
+        self.assertEqual(find_standby_scores(matrix, lengths, sd_locs).tolist(), standby)
+
+
+class ApiTests(TestCase):
+
+    def test_rejects_invalid_optimise_fields(self):
+        inputs = {"rbs_seq": "AAGGAGGUAAAAA", "cds_seq": "AUGGCUAGCAAAGGAGAAGAA", "target": 2, "temp": 37, "gram": "Negative", "rrna": "ACCUCCUUA"}
+        for field, value in [("protect", "a,b"), ("protect", {"a": 1}), ("max_evaluations", "abc"), ("max_evaluations", 0), ("max_evaluations", 2.5),
+                             ("tolerance", -1), ("time_limit", "soon"), ("designs", 11), ("target", [2])]:
+            response = self.client.post(reverse("api_optimise"), json.dumps(dict(inputs, **{field: value})), content_type="application/json")
+            self.assertEqual(response.status_code, 400, (field, value))
+            self.assertIn(field, response.json()["error"])
+
+    def test_full_offload_pool_is_busy(self):
+        inputs = {"rbs_seq": "AAGGAGGUAAAAA", "cds_seq": "AUGGCUAGCAAAGGAGAAGAA", "temp": 37, "gram": "Negative", "rrna": "ACCUCCUUA"}
+        with mock.patch.object(offload, "slots", threading.Semaphore(0)):
+            response = self.client.post(reverse("api_predict"), json.dumps(inputs), content_type="application/json")
+        self.assertEqual(response.status_code, 429)
+        self.assertEqual(response["Retry-After"], str(settings.OFFLOAD_RETRY_AFTER))
+
+    def test_equal_numbers_give_the_same_job(self):
+        inputs = {"rbs_seq": "AAGGAGGUAAAAA", "cds_seq": "AUGGCUAGCAAAGGAGAAGAA", "target": 2, "gram": "Negative", "rrna": "ACCUCCUUA", "protect": "", "max_evaluations": None, "time_limit": None, "designs": 1}
+        job_ids = {jobs.find_job_id(dict(inputs, temp=temp, tolerance=tolerance)) for temp, tolerance in [(37, 0.1), (37.0, Decimal("0.10")), (Decimal("37"), Decimal("0.1"))]}
+        self.assertEqual(len(job_ids), 1)
 
-# Create your tests here.
+    def test_non_numeric_temperature_is_an_error_for_its_row(self):
+        rows = bulk.score_rows([{"Gram stain": "Negative", "Temperature": temp, "rRNA": "ACCUCCUUA", "RBS": "AAGGAGGUAAAAA", "CDS": "AUGGCUAGCAAAGGAGAAGAA", "Error": ""} for temp in ([37], {"a": 1}, 37)])
+        self.assertEqual([row["Error"].split(":")[0] for row in rows], ["TypeError", "TypeError", ""])
+        self.assertIn("Predicted TIR", rows[2])
@@ -4,5 +4,10 @@ from . import views
 urlpatterns = [
     path("", views.home, name="home"), 
     path("predict/", views.predict, name="predict"), 
-    path("optimise/", views.optimise, name="optimise")
+    path("predict/bulk/", views.predict_bulk, name="predict_bulk"),
+    path("optimise/", views.optimise, name="optimise"),
+    path("optimise/job/<str:job_id>/", views.optimise_job, name="optimise_job"),
+    path("optimise/job/<str:job_id>/status/", views.optimise_job_status, name="optimise_job_status"),
+    path("optimise/job/<str:job_id>/events/", views.optimise_job_events, name="optimise_job_events"),
+    path("optimise/job/<str:job_id>/cancel/", views.optimise_job_cancel, name="optimise_job_cancel")
 ]
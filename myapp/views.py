@@ -1,6 +1,13 @@
-from django.shortcuts import render, HttpResponse
-from .forms import Optimise_input, Predict_input
-from . import engine
+import io
+import json
+
+import metrics
+
+from django.core.handlers.asgi import ASGIRequest
+from django.http import Http404, JsonResponse, StreamingHttpResponse
+from django.shortcuts import redirect, render, HttpResponse
+from .forms import Bulk_predict_input, Optimise_input, Predict_input
+from . import bulk, engine, jobs, offload, result_cache
 
 # Create your views here.
 def home(request):
@@ -12,9 +19,12 @@ def optimise(request):
         if form.is_valid():
             input = form.cleaned_data
             if engine.is_valid_seq(input["rbs_seq"]):
-                result = engine.optimise(input["rbs_seq"], input["target_rate"], input["temp"], input["gram"], input["cds_seq"], input["rrna"], input["protect"])
+                try:
+                    job = jobs.submit_optimise({"rbs_seq": input["rbs_seq"], "target": input["target_rate"], "temp": input["temp"], "gram": input["gram"], "cds_seq": input["cds_seq"], "rrna": input["rrna"], "protect": input["protect"], "tolerance": input["tolerance"], "max_evaluations": input["max_evaluations"], "time_limit": input["time_limit"], "designs": input["designs"]})
+                except offload.Busy as busy:
+                    return offload.set_retry_after(render(request, "optimise.html", {"form": form, "error": str(busy)}, status=429), busy)
 
-                return render(request, "optimise_result.html", {"form": form, "result":result})
+                return redirect("optimise_job", job_id=job.id)
             else:
                 return render(request,"optimise.html", {"form": form, "error":"Invalid sequence"})
         else:
@@ -24,14 +34,77 @@ def optimise(request):
         form = Optimise_input()
         return render(request, "optimise.html", {"form": form})
 
-def predict(request):
+def optimise_job(request, job_id):
+    job = jobs.get_job(job_id)
+    if job is None:
+        raise Http404("Unknown optimisation job")
+    return render(request, "optimise_job.html", {"job": job})
+
+def optimise_job_status(request, job_id):
+    job = jobs.get_job(job_id)
+    if job is None:
+        raise Http404("Unknown optimisation job")
+    return JsonResponse(job.as_dict())
+
+def optimise_job_events(request, job_id):
+    # Server-sent events: one "progress" event per change to the job, then a "done", "failed" or "cancelled" event.
+    # A client disconnecting closes the stream, and a job nobody is streaming any more is cancelled (see jobs.py).
+    job = jobs.get_job(job_id)
+    if job is None:
+        raise Http404("Unknown optimisation job")
+
+    def format_event(state):
+        if state is None:
+            return ": keep-alive\n\n"
+        event = state["status"] if state["status"] in ("done", "failed", "cancelled") else "progress"
+        return f"event: {event}\ndata: {json.dumps(state)}\n\n"
+
+    def stream():
+        job.add_listener()
+        try:
+            for state in job.iter_events():
+                yield format_event(state)
+        finally:
+            job.remove_listener()
+
+    async def astream():
+        # Under ASGI a synchronous iterator would be read to the end before anything is sent
+        job.add_listener()
+        try:
+            async for state in job.aiter_events():
+                yield format_event(state)
+        finally:
+            job.remove_listener()
+
+    response = StreamingHttpResponse(astream() if isinstance(request, ASGIRequest) else stream(), content_type="text/event-stream")
+    response["Cache-Control"] = "no-cache"
+    response["X-Accel-Buffering"] = "no"
+    return response
+
+def optimise_job_cancel(request, job_id):
+    job = jobs.get_job(job_id)
+    if job is None:
+        raise Http404("Unknown optimisation job")
+    if request.method == "POST":
+        job.cancel()
+    return redirect("optimise_job", job_id=job.id)
+
+def show_metrics(request):
+    # Stage timings and optimisation summaries of this web process, in the Prometheus text format
+    return HttpResponse(metrics.render(), content_type="text/plain; version=0.0.4; charset=utf-8")
+
+async def predict(request):
+    # The prediction runs on the offload pool, so under ASGI other requests are served meanwhile
     if request.method == "POST":
         form = Predict_input(request.POST)
         if form.is_valid():
             input = form.cleaned_data
             if engine.is_valid_seq(input["rbs_seq"]):
-                result = engine.predict(input["rbs_seq"],  input["temp"], input["gram"], input["cds_seq"], input["rrna"])
-                
+                try:
+                    result = await result_cache.predict(input["rbs_seq"],  input["temp"], input["gram"], input["cds_seq"], input["rrna"])
+                except offload.Busy as busy:
+                    return offload.set_retry_after(render(request, "predict.html", {"form": form, "error": str(busy)}, status=429), busy)
+
                 return render(request, "predict_result.html", {"form": form, "result":result})
             else:
                 return render(request,"predict.html", {"form": form, "error":"Invalid sequence"})
@@ -39,4 +112,42 @@ def predict(request):
             print("NOT VALID")
     else:
         form = Predict_input()
-        return render(request, "predict.html", {"form": form})
\ No newline at end of file
+        return render(request, "predict.html", {"form": form})
+
+async def stream_results(scored, chunks):
+    # CSV lines of each scored chunk, scoring the next one on the offload pool before reading any more of the upload
+    header = True
+    while scored:
+        yield "".join(bulk.iter_results_csv(scored, header))
+        header = False
+        chunk = next(chunks, None)
+        scored = await offload.run_when_free(bulk.score_rows, chunk) if chunk is not None else None
+
+async def predict_bulk(request):
+    if request.method == "POST":
+        form = Bulk_predict_input(request.POST, request.FILES)
+        if form.is_valid():
+            input = form.cleaned_data
+            upload = input["sequences"]
+            lines = io.TextIOWrapper(upload.file, encoding="utf-8-sig", newline="")
+            try:
+                rows = bulk.read_rows(lines, bulk.is_fasta(upload.name), input["gram"], float(input["temp"]), input["rrna"])
+            except ValueError as e:
+                return render(request, "predict_bulk.html", {"form": form, "error": str(e)})
+
+            # Results are streamed back as each chunk is scored, so large uploads never sit in memory. Under ASGI the
+            # chunks are scored on the offload pool, the first before responding so a busy server can still answer 429.
+            if isinstance(request, ASGIRequest):
+                chunks = bulk.iter_chunks(rows)
+                try:
+                    results = stream_results(await offload.run(bulk.score_rows, next(chunks, [])), chunks)
+                except offload.Busy as busy:
+                    return offload.set_retry_after(render(request, "predict_bulk.html", {"form": form, "error": str(busy)}, status=429), busy)
+            else:
+                results = bulk.iter_results_csv(bulk.predict_rows(rows))
+            response = StreamingHttpResponse(results, content_type="text/csv")
+            response["Content-Disposition"] = 'attachment; filename="predictions.csv"'
+            return response
+    else:
+        form = Bulk_predict_input()
+    return render(request, "predict_bulk.html", {"form": form})
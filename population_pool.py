@@ -0,0 +1,91 @@
+import multiprocessing
+import threading
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+import energy_table
+import metrics
+import model_registry
+import stopping
+from hybridisation import get_hybridisation_engine
+from incremental import find_tir_batch_incremental
+
+pools = {}
+pools_lock = threading.Lock()
+
+# Cancellable batches are scored in chunks of about this many candidates, so a cancellation is seen between chunks
+cancellable_chunk_size = 16
+
+
+def init_worker(model_path, mmap_mode, backend, flat_path, energy_table_keys, metrics_enabled):
+
+    # Each worker loads the model and ViennaRNA once, from the same files as the parent, for its whole lifetime
+    model_registry.configure(model_path, mmap_mode or "", backend, flat_path or "")
+    energy_table.configure(energy_table_keys)
+    metrics.configure(metrics_enabled)
+    model_registry.get_predictor()
+
+
+def get_pool(workers):
+
+    with pools_lock:
+        pool = pools.get(workers)
+        if pool is None:
+            # Spawned workers do not inherit locks held by the web server's threads at fork time
+            pool = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn"), initializer=init_worker, initargs=(model_registry.model_path, model_registry.mmap_mode, model_registry.prediction_backend, model_registry.flat_forest_path, energy_table.lazy_build_keys, metrics.enabled))
+            pools[workers] = pool
+
+    return pool
+
+
+def run_recorded(function, *args):
+
+    # Runs function in a worker and returns its result with the metrics it recorded, for unpack_recorded in the parent
+    result = function(*args)
+    return result, metrics.take() if metrics.enabled else None
+
+
+def unpack_recorded(outcome):
+
+    result, recorded = outcome
+    metrics.merge(recorded)
+    return result
+
+
+def split_batch(RBS_list, count):
+
+    return [list(chunk) for chunk in np.array_split(np.array(RBS_list, dtype=object), min(count, len(RBS_list)))]
+
+
+def find_tir_batch_parallel(gram_stain,temperature,rRNA,RBS_list,CDS,workers=None,parent=None,cancel=None):
+
+    # Candidates are scored as mutants of parent (see incremental.py), in chunks across the pool when workers > 1.
+    # With a cancellation token the batch is split into smaller chunks and stopped between them by raising
+    # stopping.Cancelled, dropping any chunks the pool has not started.
+    serial = not workers or workers < 2 or len(RBS_list) < 2
+    if cancel is None and serial:
+        return find_tir_batch_incremental(gram_stain,temperature,rRNA,RBS_list,CDS,parent)
+
+    chunk_count = -(-len(RBS_list) // cancellable_chunk_size) if cancel is not None else workers
+    if serial:
+        rates = []
+        for chunk in split_batch(RBS_list, chunk_count):
+            if rates and cancel.is_cancelled():
+                raise stopping.Cancelled()
+            rates.append(find_tir_batch_incremental(gram_stain,temperature,rRNA,chunk,CDS,parent))
+        return np.concatenate(rates) if rates else np.array([])
+
+    # Build or map the energy table here first so the workers don't all build it at once
+    get_hybridisation_engine(rRNA.upper().replace("T","U")[-8:],temperature)
+
+    futures = [get_pool(workers).submit(run_recorded,find_tir_batch_incremental,gram_stain,temperature,rRNA,chunk,CDS,parent) for chunk in split_batch(RBS_list, max(chunk_count, workers))]
+    rates = []
+    for future in futures:
+        if cancel is not None and cancel.is_cancelled():
+            for pending in futures:
+                pending.cancel()
+            raise stopping.Cancelled()
+        rates.append(unpack_recorded(future.result()))
+
+    return np.concatenate(rates)
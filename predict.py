@@ -20,9 +20,12 @@
 
 import RNA
 import numpy as np
-import pandas as pd
 import matplotlib.pyplot as plt
-import joblib
+
+import metrics
+from hybridisation import get_hybridisation_engine, model_details
+from model_registry import get_predictor
+from structure_scores import encode_structures, find_accessibility_scores, find_standby_scores
 
 
 # In[3]:
@@ -30,10 +33,8 @@ import joblib
 
 def find_hybridization_energy(sequence1, sequence2, temp):
 
-    RNA.cvar.temperature = temp
-
     # First, we concatenate the two RNA sequences using the '&' symbol
-    hybrid_sequence = RNA.fold_compound(f"{sequence1}&{sequence2}")
+    hybrid_sequence = RNA.fold_compound(f"{sequence1}&{sequence2}", model_details(temp))
 
     # Finally, we use the ViennaRNA library's inbuilt mfe_dimer function to compute the hybridization energy
     structure, energy = hybrid_sequence.mfe_dimer()
@@ -44,40 +45,10 @@ def find_hybridization_energy(sequence1, sequence2, temp):
 # In[4]:
 
 
+@metrics.timed("find_spacing")
 def find_spacing(rRNA,rbs,temp,gram):
 
-  RNA.cvar.temperature = temp
-  min_energy = 0
-  sd = ""
-  best_spacing = 0
-
-  for i in range(len(rbs)-len(rRNA)+1):
-
-    energy = find_hybridization_energy(rRNA,rbs[i:i+len(rRNA)],temp)
-    spacing = len(rbs[i+len(rRNA):])
-    penalty = 1
-
-    if gram == "Positive":
-      opt_spacing = 9
-      if spacing < opt_spacing:
-        penalty = np.exp(-0.5*(((spacing - opt_spacing)**2)/1))                   # Punishing lower spacing more for Gram-positives
-      elif spacing > opt_spacing:
-        penalty = np.exp(-0.5*(((spacing - opt_spacing)**2)/2))
-    elif gram == "Negative":
-      opt_spacing = 7
-      if spacing < opt_spacing:
-        penalty = np.exp(-0.5*(((spacing - opt_spacing)**2)/2))
-      elif spacing > opt_spacing:
-        penalty = np.exp(-0.5*(((spacing - opt_spacing)**2)/1))                   # Punishing higher spacing more for Gram-negatives
-
-    energy = energy * penalty
-
-    if energy <= min_energy:
-      min_energy = energy
-      sd = rbs[i:i+len(rRNA)]
-      best_spacing = spacing
-
-  return find_hybridization_energy(rRNA,sd,temp), sd, best_spacing
+  return get_hybridisation_engine(rRNA,temp).find_spacing(rbs,gram)
 
 
 # In[5]:
@@ -99,16 +70,20 @@ def find_au_score(rbs,sd):
 # In[6]:
 
 
-def find_accessibility_score(rbs,cds,sd,temp):
-
-  RNA.cvar.temperature = temp
-
-  sd_loc = rbs.index(sd)
+@metrics.timed("fold")
+def find_structure(rbs,cds,temp):
 
   upstream = rbs[-27:]
   downstream = cds[:54-len(upstream)]
 
-  structure, fold_energy = RNA.fold(upstream + downstream)
+  return RNA.fold_compound(upstream + downstream, model_details(temp)).mfe()
+
+
+def find_accessibility_score(rbs,cds,sd,temp):
+
+  sd_loc = rbs.index(sd)
+
+  structure, fold_energy = find_structure(rbs,cds,temp)
 
   loop_count = structure.count(".")                                               # Number of unpaired nucleotides
   stack_count = structure.count("(") + structure.count(")")                       # Number of paired nucleotides
@@ -118,6 +93,12 @@ def find_accessibility_score(rbs,cds,sd,temp):
   return structure, accessibility_score, fold_energy
 
 
+def find_cds_prefix(rbs,cds):
+
+  # Only the start of the CDS that reaches find_accessibility_score or find_codon_score can influence a prediction
+  return cds[:max(3,54-len(rbs[-27:]))]
+
+
 # In[7]:
 
 
@@ -171,37 +152,93 @@ def find_codon_score(cds):
   return codon_score
 
 
-# In[10]:
+# In[15]:
 
 
-model = joblib.load("iGEM IITM 2023 - Final Model.joblib")
+feature_columns = ["Binding energy","Spacing","AU score","Accessibility score","Folding energy","Standby accessibility","Codon score","Gram stain numeric"]
 
+def find_features(gram_stain,temperature,rRNA,RBS,CDS):
 
-# In[15]:
+  # Sequences are expected to be uppercase RNA with rRNA already truncated to its last 8 nucleotides
+  binding_energy, shine_dalgarno, spacing = find_spacing(rRNA,RBS,temperature,gram_stain)
+  au_score = find_au_score(RBS,shine_dalgarno)
+  structure, accessibility_score, folding_energy = find_accessibility_score(RBS,CDS,shine_dalgarno,temperature)
+  standby_accessibility = find_standby_score(RBS,shine_dalgarno,structure)
+  codon_score = find_codon_score(CDS)
+
+  gram_stain_numeric = 1
+  if gram_stain == "Negative":
+    gram_stain_numeric = 0
 
+  return [binding_energy, spacing, au_score, accessibility_score, folding_energy, standby_accessibility, codon_score, gram_stain_numeric]
 
-def find_tir(gram_stain,temperature,rRNA,RBS,CDS):
 
-  rRNA = rRNA.upper().replace("T","U")
-  RBS = RBS.upper().replace("T","U")
-  CDS = CDS.upper().replace("T","U")
-  rRNA = rRNA[-8:]
+def find_sequence_features(gram_stain,temperature,rRNA,RBS,CDS):
 
+  # Everything find_features needs except the two scores read off the structure, which combine_features
+  # computes for a whole batch at once
   binding_energy, shine_dalgarno, spacing = find_spacing(rRNA,RBS,temperature,gram_stain)
   au_score = find_au_score(RBS,shine_dalgarno)
-  structure, accessibility_score, folding_energy = find_accessibility_score(RBS,CDS,shine_dalgarno,temperature)
-  standby_accessibility = find_standby_score(RBS,shine_dalgarno,structure)
+  structure, folding_energy = find_structure(RBS,CDS,temperature)
   codon_score = find_codon_score(CDS)
 
   gram_stain_numeric = 1
   if gram_stain == "Negative":
     gram_stain_numeric = 0
 
-  features = np.array([binding_energy, spacing, au_score, accessibility_score, folding_energy, standby_accessibility, codon_score,gram_stain_numeric]).reshape(1,-1)
-  df = pd.DataFrame(features)
-  df.columns = ["Binding energy","Spacing","AU score","Accessibility score","Folding energy","Standby accessibility","Codon score","Gram stain numeric"]
+  return [binding_energy, spacing, au_score, folding_energy, codon_score, gram_stain_numeric], structure, RBS.index(shine_dalgarno)
+
+
+@metrics.timed("structure_scores")
+def combine_features(sequence_features, structures, sd_locs):
+
+  # find_features rows for a batch of find_sequence_features results
+  matrix, lengths = encode_structures(structures)
+  accessibility_scores = find_accessibility_scores(matrix)
+  standby_scores = find_standby_scores(matrix, lengths, sd_locs)
+
+  features = []
+  for (binding_energy, spacing, au_score, folding_energy, codon_score, gram_stain_numeric), accessibility_score, standby_accessibility in zip(sequence_features, accessibility_scores.tolist(), standby_scores.tolist()):
+    standby_accessibility = standby_accessibility or 0 # find_standby_score gives an int 0 when no window is kept
+    features.append([binding_energy, spacing, au_score, accessibility_score, folding_energy, standby_accessibility, codon_score, gram_stain_numeric])
+
+  return features
+
+
+def find_features_batch(gram_stain,temperature,rRNA,RBS_list,CDS):
+
+  # find_features for every RBS, with the same expectations about normalised input
+  sequence_features, structures, sd_locs = zip(*[find_sequence_features(gram_stain,temperature,rRNA,RBS,CDS) for RBS in RBS_list]) if RBS_list else ((), (), ())
+
+  return combine_features(sequence_features, structures, sd_locs)
+
+
+def predict_features(features):
+
+  with metrics.stage("feature_matrix"):
+    features = np.asarray(features, dtype=np.float64).reshape(-1,len(feature_columns))
+  if len(features) == 0:
+    return np.empty(0)
+
+  with metrics.stage("model_predict"):
+    return get_predictor().predict(features)
+
+
+@metrics.timed("find_tir_batch")
+def find_tir_batch(gram_stain,temperature,rRNA,RBS_list,CDS):
+
+  rRNA = rRNA.upper().replace("T","U")
+  CDS = CDS.upper().replace("T","U")
+  rRNA = rRNA[-8:]
+
+  features = find_features_batch(gram_stain,temperature,rRNA,[RBS.upper().replace("T","U") for RBS in RBS_list],CDS)
+
+  return predict_features(features)
+
+
+def find_tir(gram_stain,temperature,rRNA,RBS,CDS):
 
-  tir = model.predict(df)[0]
+  tir = find_tir_batch(gram_stain,temperature,rRNA,[RBS],CDS)[0]
 
   return tir
 
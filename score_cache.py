@@ -0,0 +1,78 @@
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+from predict import find_cds_prefix, find_tir_batch
+
+
+class ScoreCache:
+    # Bounded least-recently-used store of predicted initiation rates
+
+    def __init__(self, maxsize=100000):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._scores = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._scores)
+
+    def key(self, gram_stain, temperature, rRNA, RBS, CDS):
+        # Sequences are expected to be normalised the same way find_tir normalises them
+        return (gram_stain, float(temperature), rRNA, RBS, find_cds_prefix(RBS, CDS))
+
+    def score_batch(self, gram_stain, temperature, rRNA, RBS_list, CDS, scorer=find_tir_batch):
+        rRNA = rRNA.upper().replace("T","U")[-8:]
+        CDS = CDS.upper().replace("T","U")
+        RBS_list = [RBS.upper().replace("T","U") for RBS in RBS_list]
+        keys = [self.key(gram_stain, temperature, rRNA, RBS, CDS) for RBS in RBS_list]
+
+        # Hits are copied out under the lock, as another thread sharing the cache may evict them before the batch returns
+        found = {}
+        missing = {}
+        with self._lock:
+            for key, RBS in zip(keys, RBS_list):
+                if key in self._scores:
+                    self._scores.move_to_end(key)
+                    found[key] = self._scores[key]
+                    self.hits += 1
+                elif key in missing:
+                    self.hits += 1 # Duplicate within the batch, scored once below
+                else:
+                    missing[key] = RBS
+                    self.misses += 1
+
+        if missing:
+            rates = scorer(gram_stain, temperature, rRNA, list(missing.values()), CDS)
+            missing = dict(zip(missing.keys(), rates))
+            with self._lock:
+                self._scores.update(missing)
+                while len(self._scores) > self.maxsize:
+                    self._scores.popitem(last=False)
+            found.update(missing)
+
+        return np.array([found[key] for key in keys])
+
+    def update_scores(self, gram_stain, temperature, rRNA, RBS_list, CDS, rates):
+        # Stores rates scored elsewhere, such as by an exhaustive search, for later lookups
+        rRNA = rRNA.upper().replace("T","U")[-8:]
+        CDS = CDS.upper().replace("T","U")
+        with self._lock:
+            for RBS, rate in zip(RBS_list, rates):
+                self._scores[self.key(gram_stain, temperature, rRNA, RBS.upper().replace("T","U"), CDS)] = rate
+            while len(self._scores) > self.maxsize:
+                self._scores.popitem(last=False)
+
+    def find_scores(self, gram_stain, temperature, rRNA, CDS):
+        # Every cached RBS scored for this design problem, mapped to its rate
+        rRNA = rRNA.upper().replace("T","U")[-8:]
+        CDS = CDS.upper().replace("T","U")
+        with self._lock:
+            return {key[3]: rate for key, rate in self._scores.items()
+                    if key[:3] == (gram_stain, float(temperature), rRNA) and key[4] == find_cds_prefix(key[3], CDS)}
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {"hits": self.hits, "misses": self.misses, "size": len(self._scores), "hit_ratio": self.hits / lookups if lookups else 0.0}
@@ -0,0 +1,65 @@
+import threading
+import time
+
+# Reasons an optimisation run stopped, as returned by optimize_rbs
+target_reached = "target_reached"
+max_evaluations_reached = "max_evaluations"
+deadline_reached = "deadline"
+generations_completed = "generations"
+stagnated = "stagnated"
+cancelled = "cancelled"
+search_completed = "exhausted"
+
+
+class Cancelled(Exception):
+    # Raised by scoring when a run is cancelled part way through a batch
+    pass
+
+
+class CancellationToken:
+    # Set from another thread to stop a run at its next generation or batch chunk
+
+    def __init__(self):
+        self._event = threading.Event()
+
+    def cancel(self):
+        self._event.set()
+
+    def is_cancelled(self):
+        return self._event.is_set()
+
+
+class StoppingCriteria:
+    # Stops a run at whichever comes first: cancellation, the target within tolerance, the evaluation budget or the wall-clock deadline
+
+    def __init__(self, desired_initiation_rate, tolerance=1e-4, max_evaluations=None, time_limit=None, cancel=None):
+        self.desired_initiation_rate = desired_initiation_rate
+        self.cancel = cancel
+        self.tolerance = tolerance
+        self.max_evaluations = max_evaluations
+        self.started = time.monotonic()
+        self.deadline = self.started + time_limit if time_limit is not None else None
+
+    def find_elapsed(self):
+
+        return time.monotonic() - self.started
+
+    def find_remaining_evaluations(self, evaluations, wanted):
+
+        if self.max_evaluations is None:
+            return wanted
+
+        return max(min(wanted, self.max_evaluations - evaluations), 0)
+
+    def find_stop_reason(self, best_rate, evaluations):
+
+        if self.cancel is not None and self.cancel.is_cancelled():
+            return cancelled
+        if best_rate is not None and abs(best_rate - self.desired_initiation_rate) < self.tolerance: # None until something is scored
+            return target_reached
+        if self.max_evaluations is not None and evaluations >= self.max_evaluations:
+            return max_evaluations_reached
+        if self.deadline is not None and time.monotonic() >= self.deadline:
+            return deadline_reached
+
+        return None
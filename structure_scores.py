@@ -0,0 +1,49 @@
+import numpy as np
+
+# find_accessibility_score and find_standby_score over a whole batch of dot-bracket structures at once
+
+
+def encode_structures(structures):
+
+    # One row of byte codes per structure, zero-padded to the longest
+    structures = list(structures)
+    if not structures:
+        return np.zeros((0, 0), dtype=np.uint8), np.zeros(0, dtype=np.int64)
+
+    encoded = np.array([structure.encode() for structure in structures], dtype=bytes)
+    matrix = encoded.view(np.uint8).reshape(len(structures), encoded.itemsize)
+    lengths = np.array([len(structure) for structure in structures], dtype=np.int64)
+
+    return matrix, lengths
+
+
+def find_accessibility_scores(matrix):
+
+    loop_count = (matrix == ord(".")).sum(axis=1)
+    stack_count = ((matrix == ord("(")) | (matrix == ord(")"))).sum(axis=1)
+
+    return loop_count / (loop_count + stack_count)
+
+
+def find_standby_scores(matrix, lengths, sd_locs, rRNA_length=8):
+
+    # Like find_standby_score, walks rRNA-sized windows back from each SD and keeps a window's accessibility
+    # when its accessibility divided by the gap beats the accessibility kept so far
+    sd_locs = np.asarray(sd_locs, dtype=np.int64)
+    rows = np.arange(len(matrix))
+    unpaired = np.zeros((len(matrix), matrix.shape[1] + 1), dtype=np.int64)
+    np.cumsum(matrix == ord("."), axis=1, out=unpaired[:, 1:])
+
+    # The structure before the SD may be shorter than the RBS before it, leaving windows short or empty
+    ends = np.minimum(sd_locs, lengths)
+    best_accessibility = np.zeros(len(matrix))
+
+    for i in range(max(sd_locs.max(initial=0) - rRNA_length + 1, 0)):
+        gap = i + rRNA_length
+        stop = np.maximum(ends - i, 0)
+        start = np.maximum(ends - gap, 0)
+        accessibility = (unpaired[rows, stop] - unpaired[rows, start]) / rRNA_length
+        better = (i < sd_locs - rRNA_length + 1) & (accessibility / gap > best_accessibility)
+        best_accessibility = np.where(better, accessibility, best_accessibility)
+
+    return best_accessibility